@@ -0,0 +1,89 @@
+"""
+Checks the cold start of the CLI against a time budget, and shows the slowest imports.
+
+    python -m benchmarks.coldstart --budget-ms 250
+    python -m benchmarks.coldstart --directory sample -- ls
+
+Runs the command in fresh interpreters with -X importtime. Exits with status 1 if the best
+wall time is over the budget, so it can guard shell hooks and provisioning loops.
+"""
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import click
+
+from benchmarks.generators import write_recipe_tree
+
+CLI = "from setitup.main import main; main()"
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def run_cli(args: List[str]) -> Tuple[float, str]:
+    """
+    Runs the CLI in a fresh interpreter.
+
+    Returns:
+        Tuple[float, str]: wall time in seconds and the -X importtime report.
+    """
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", CLI, *args],
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        sys.exit(f"Command failed with status {proc.returncode}:\n{proc.stderr[-2000:]}")
+    return elapsed, proc.stderr
+
+
+def parse_importtime(report: str) -> Dict[str, Tuple[int, int]]:
+    """
+    Parses -X importtime output.
+
+    Returns:
+        Dict[str, Tuple[int, int]]: self and cumulative microseconds of top-level imports by module.
+    """
+    imports: Dict[str, Tuple[int, int]] = {}
+    for line in report.splitlines():
+        match = IMPORT_LINE.match(line)
+        # Nested imports are already counted in the cumulative time of their parent
+        if match and len(match.group(3)) == 1:
+            imports[match.group(4)] = (int(match.group(1)), int(match.group(2)))
+    return imports
+
+
+@click.command(context_settings=dict(ignore_unknown_options=True))
+@click.argument("args", nargs=-1, type=click.UNPROCESSED)
+@click.option("--directory", type=click.Path(file_okay=False, path_type=Path),
+              help="Recipe directory. Defaults to a generated one with 100 packages.")
+@click.option("--budget-ms", default=250.0, show_default=True, help="Allowed wall time of the best run.")
+@click.option("--repeat", default=5, show_default=True)
+@click.option("--top", default=10, show_default=True, help="Number of slowest imports to show.")
+def main(args: Tuple[str, ...], directory: Optional[Path], budget_ms: float, repeat: int, top: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        if directory is None:
+            directory = Path(tmp)
+            write_recipe_tree(directory, 100, 10, 5, 10)
+        command = [str(directory), *(args or ("ls",))]
+
+        # The first run builds the recipe catalog
+        run_cli(command)
+        runs = [run_cli(command) for _ in range(repeat)]
+
+    best, report = min(runs)
+    imports = parse_importtime(report)
+    print(f"setup_env {' '.join(command[1:])}: best of {repeat} {best * 1000:.1f}ms "
+          f"(budget {budget_ms:.0f}ms)")
+    print(f"{'cumulative(ms)':>15} {'self(ms)':>9}  module")
+    for name, (own, cumulative) in sorted(imports.items(), key=lambda item: -item[1][1])[:top]:
+        print(f"{cumulative / 1000:15.1f} {own / 1000:9.1f}  {name}")
+
+    if best * 1000 > budget_ms:
+        sys.exit(f"Cold start over budget by {best * 1000 - budget_ms:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Synthetic inputs for the benchmarks: recipe trees, settings with deep bundles and large rc files.
+"""
+import json
+from pathlib import Path
+from typing import Any, Dict, List
+
+from setitup.utils.rc import END_MARKER, START_MARKER
+
+
+def synthetic_recipes(n_recipes: int, n_steps: int) -> Dict[str, Any]:
+    """
+    Builds a merged recipes dictionary with alternating guard and shell steps.
+    """
+    recipes: Dict[str, Any] = {}
+    for i in range(n_recipes):
+        steps = [
+            {"kind": "guard", "conditions": ["True"]} if j % 10 == 0 else
+            {"kind": "shell", "command": f"echo pkg_{i} step_{j} {{env.HOME}}"}
+            for j in range(n_steps)
+        ]
+        recipes[f"pkg_{i}"] = {"install": {"steps": steps},
+                               "config": {"steps": steps[: n_steps // 5]}}
+    return recipes
+
+
+def synthetic_files(n_files: int, n_packages: int, n_steps: int) -> List[Dict[str, Any]]:
+    """
+    Builds recipe documents. Each file defines its own packages and overrides a shared one.
+    """
+    files: List[Dict[str, Any]] = []
+    for i in range(n_files):
+        doc: Dict[str, Any] = {
+            f"pkg_{i}_{j}": {
+                "depends": [f"pkg_{i}_{j - 1}"] if j else [],
+                "install": {"steps": [{"kind": "shell", "command": f"echo {i} {j} {k}"} for k in range(n_steps)]},
+                "config": {"steps": [{"kind": "update", "source": "a", "target": "b",
+                                      "sections": ["x"], "markers": []}]},
+            }
+            for j in range(n_packages)
+        }
+        doc["shared"] = {"config": {"steps": [
+            {"kind": "shell", "command": f"echo shared {i}"}]}}
+        files.append(doc)
+    return files
+
+
+def _toml_value(value: Any) -> str:
+    # JSON strings, numbers, booleans and arrays of them are valid TOML
+    return json.dumps(value)
+
+
+def _toml_table(name: str, table: Dict[str, Any], array: bool = False) -> List[str]:
+    lines = [f"[[{name}]]" if array else f"[{name}]"]
+    nested: List[str] = []
+    for key, value in table.items():
+        if isinstance(value, dict):
+            nested += _toml_table(f"{name}.{key}", value)
+        elif isinstance(value, list) and value and isinstance(value[0], dict):
+            for item in value:
+                nested += _toml_table(f"{name}.{key}", item, array=True)
+        else:
+            lines.append(f"{key} = {_toml_value(value)}")
+    return lines + nested
+
+
+def dump_toml(doc: Dict[str, Any]) -> str:
+    """
+    Writes the subset of TOML used by recipes and settings: tables, arrays of tables and plain values.
+    """
+    lines: List[str] = []
+    for key, value in doc.items():
+        if isinstance(value, dict):
+            lines += _toml_table(key, value)
+        else:
+            lines.insert(0, f"{key} = {_toml_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def write_recipe_tree(directory: Path, n_packages: int, n_steps: int, n_files: int, depth: int) -> None:
+    """
+    Writes settings/ and recipes/ under directory. Packages form dependency chains of the given
+    depth, and bundles range from single chains to all packages.
+
+    Args:
+        directory (Path): target directory, created if missing.
+        n_packages (int): total number of packages.
+        n_steps (int): install steps per package.
+        n_files (int): number of recipe files the packages are spread over.
+        depth (int): length of dependency chains.
+    """
+    recipes_dir = directory / "recipes"
+    settings_dir = directory / "settings"
+    recipes_dir.mkdir(parents=True, exist_ok=True)
+    settings_dir.mkdir(parents=True, exist_ok=True)
+
+    names = [f"pkg_{i}" for i in range(n_packages)]
+    per_file = -(-n_packages // n_files)
+    for f in range(n_files):
+        doc: Dict[str, Any] = {}
+        for i in range(f * per_file, min((f + 1) * per_file, n_packages)):
+            steps = [
+                {"kind": "guard", "conditions": [f"is_installed('tool_{i % 97}') or True"]} if j % 10 == 0 else
+                {"kind": "shell", "command": f"echo {names[i]} step_{j} {{env.HOME}}"}
+                for j in range(n_steps)
+            ]
+            recipe: Dict[str, Any] = {}
+            if i % depth:
+                recipe["depends"] = [names[i - 1]]
+            recipe["install"] = {"steps": steps}
+            recipe["config"] = {"steps": steps[: max(1, n_steps // 10)]}
+            doc[names[i]] = recipe
+        (recipes_dir / f"recipes_{f:03d}.toml").write_text(dump_toml(doc))
+
+    bundles = {f"chain_{c}": names[c * depth: (c + 1) * depth]
+               for c in range(-(-n_packages // depth))}
+    bundles["everything"] = names
+    (settings_dir / "settings.toml").write_text(
+        dump_toml({"root": False, "bundles": bundles}))
+
+
+def synthetic_shellrc(n_sections: int, lines_per_section: int) -> List[str]:
+    """
+    Builds the lines of an rc file with managed sections and unmanaged lines in between.
+    """
+    lines: List[str] = []
+    for s in range(n_sections):
+        lines.append(f"alias user_{s}='echo {s}'")
+        lines.append(f"{START_MARKER} section_{s}")
+        lines += [f"export VAR_{s}_{k}=\"$HOME/some/longer/path/{s}/{k}\""
+                  for k in range(lines_per_section)]
+        lines.append(f"{END_MARKER} section_{s}")
+        lines.append("")
+    return lines
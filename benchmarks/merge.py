@@ -0,0 +1,51 @@
+"""
+Compares merge_dicts against the previous FlatDict round-trip on many recipe files.
+
+    python -m benchmarks.merge --files 300 --packages 20 --steps 10
+"""
+import time
+from typing import Any, Callable, Dict, List
+
+import click
+from flatdict import FlatDict
+
+from benchmarks.generators import synthetic_files
+from setitup.utils.utils import merge_dicts
+
+
+def flatdict_merge(dicts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    The previous implementation, kept as a reference.
+    """
+    empty_dict: Dict[str, Any] = {}
+    merged = FlatDict(empty_dict)
+    for item in dicts:
+        merged.update(FlatDict(item))
+    return merged.as_dict()
+
+
+def timed(f: Callable[[List[Dict[str, Any]]], Dict[str, Any]], files: List[Dict[str, Any]], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f(files)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+@click.command()
+@click.option("--files", "n_files", default=300, show_default=True)
+@click.option("--packages", "n_packages", default=20, show_default=True)
+@click.option("--steps", "n_steps", default=10, show_default=True)
+@click.option("--repeat", default=3, show_default=True)
+def main(n_files: int, n_packages: int, n_steps: int, repeat: int) -> None:
+    files = synthetic_files(n_files, n_packages, n_steps)
+    native = timed(merge_dicts, files, repeat)
+    flat = timed(flatdict_merge, files, repeat)
+    print(f"{n_files} files, {n_files * n_packages} packages")
+    print(f"merge_dicts:    {native:.4f}s")
+    print(f"FlatDict merge: {flat:.4f}s ({flat / native:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
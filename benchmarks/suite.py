@@ -0,0 +1,152 @@
+"""
+Runs all benchmarks on synthetic inputs and compares them against a stored baseline.
+
+    python -m benchmarks.suite --scale small
+    python -m benchmarks.suite --scale full --save-baseline
+
+Exits with status 1 if any case is slower than its baseline by more than the tolerance.
+Baselines are machine dependent; save one on the machine that runs the comparison.
+"""
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+import click
+
+from benchmarks.generators import synthetic_shellrc, write_recipe_tree
+from setitup.models.dict_objects import check_dict, collect_errors
+from setitup.models.recipes import Recipes
+from setitup.models.steps import ShellStep
+from setitup.utils.io import read_local_toml, read_local_tomls
+from setitup.utils.rc import RcFile
+from setitup.utils.utils import merge_dicts, sub
+
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+
+# packages, steps per package, recipe files, dependency depth, rc sections, lines per rc section
+SCALES: Dict[str, Tuple[int, int, int, int, int, int]] = {
+    "small": (100, 10, 5, 10, 200, 10),
+    "full": (1000, 50, 20, 50, 5000, 20),
+}
+
+CLI = "from setitup.main import main; main()"
+
+
+def best_of(f: Callable[[], Any], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_cases(directory: Path, scale: str, repeat: int) -> Dict[str, float]:
+    """
+    Generates inputs for the scale under directory and times every case.
+
+    Returns:
+        Dict[str, float]: best time in seconds by case name.
+    """
+    n_packages, n_steps, n_files, depth, n_sections, section_lines = SCALES[scale]
+    write_recipe_tree(directory, n_packages, n_steps, n_files, depth)
+    recipe_files = sorted((directory / "recipes").glob("*.toml"))
+    docs = [read_local_toml(path) for path in recipe_files]
+    merged = merge_dicts(docs, lists="append")
+    shell_nodes = [step for recipe in merged.values() for step in recipe["install"]["steps"]
+                   if step["kind"] == "shell"]
+    templates = [node["command"] for node in shell_nodes]
+
+    rc_lines = synthetic_shellrc(n_sections, section_lines)
+    rc_file = RcFile(rc_lines)
+    rc_update = RcFile({f"section_{s}": [f"export UPDATED_{s}=1"]
+                        for s in range(0, n_sections, 10)})
+
+    def check_nodes() -> None:
+        with collect_errors():
+            for node in shell_nodes:
+                check_dict(node, [], ShellStep.dict_keys)
+
+    def update_rc() -> None:
+        RcFile((list(rc_file.sections), dict(rc_file.content))).update(rc_update)
+
+    def cli_ls() -> None:
+        subprocess.run([sys.executable, "-c", CLI, str(directory), "ls"],
+                       check=True, stdout=subprocess.DEVNULL)
+
+    def cli_help() -> None:
+        subprocess.run([sys.executable, "-c", CLI, "--help"],
+                       check=True, stdout=subprocess.DEVNULL)
+
+    # Builds the catalog, so the CLI cases measure the cached path
+    cli_ls()
+
+    cases: List[Tuple[str, Callable[[], Any]]] = [
+        ("read_local_tomls", lambda: read_local_tomls(recipe_files, lists="append")),
+        ("merge_dicts", lambda: merge_dicts(docs, lists="append")),
+        ("check_dict", check_nodes),
+        ("Recipes.init", lambda: Recipes.init(merged)),
+        ("sub", lambda: [sub(template) for template in templates]),
+        ("RcFile.parse_text", lambda: RcFile.parse_text(rc_lines)),
+        ("RcFile.to_text", rc_file.to_text),
+        ("RcFile.update", update_rc),
+        ("cli_help", cli_help),
+        ("cli_ls", cli_ls),
+    ]
+    return {name: best_of(f, repeat) for name, f in cases}
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], tolerance: float, min_delta: float) -> bool:
+    """
+    Prints results next to the baseline. Slowdowns below min_delta seconds are treated as noise.
+
+    Returns:
+        bool: whether no case regressed by more than the tolerance.
+    """
+    ok = True
+    print(f"{'case':<20} {'time(s)':>10} {'baseline(s)':>12} {'ratio':>7}")
+    for name, elapsed in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            print(f"{name:<20} {elapsed:10.4f} {'-':>12} {'-':>7}")
+            continue
+        ratio = elapsed / reference
+        regressed = ratio > 1 + tolerance and elapsed - reference > min_delta
+        ok = ok and not regressed
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:<20} {elapsed:10.4f} {reference:12.4f} {ratio:7.2f}{flag}")
+    return ok
+
+
+@click.command()
+@click.option("--scale", type=click.Choice(list(SCALES)), default="small", show_default=True)
+@click.option("--repeat", default=3, show_default=True)
+@click.option("--baseline", "baseline_path", type=click.Path(dir_okay=False, path_type=Path),
+              default=BASELINE_PATH, show_default=True)
+@click.option("--tolerance", default=0.3, show_default=True,
+              help="Allowed slowdown relative to the baseline, e.g. 0.3 for 30%.")
+@click.option("--min-delta", default=0.005, show_default=True,
+              help="Slowdowns below this many seconds are never reported.")
+@click.option("--save-baseline", is_flag=True, help="Store these results as the baseline of the scale.")
+def main(scale: str, repeat: int, baseline_path: Path, tolerance: float, min_delta: float, save_baseline: bool) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        results = run_cases(Path(directory), scale, repeat)
+
+    baselines: Dict[str, Dict[str, float]] = json.loads(
+        baseline_path.read_text()) if baseline_path.is_file() else {}
+    ok = compare(results, baselines.get(scale, {}), tolerance, min_delta)
+
+    if save_baseline:
+        baselines[scale] = results
+        baseline_path.write_text(json.dumps(baselines, indent=2) + "\n")
+        print(f"Saved baseline for {scale} to {baseline_path}")
+    elif not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""
+Times single-pass validation of a synthetic recipe catalog.
+
+    python -m benchmarks.validate --recipes 5000 --steps 50
+"""
+import time
+
+import click
+
+from benchmarks.generators import synthetic_recipes
+from setitup.models.recipes import Recipes
+
+
+@click.command()
+@click.option("--recipes", "n_recipes", default=5000, show_default=True)
+@click.option("--steps", "n_steps", default=50, show_default=True)
+def main(n_recipes: int, n_steps: int) -> None:
+    catalog = synthetic_recipes(n_recipes, n_steps)
+    start = time.perf_counter()
+    Recipes.init(catalog)
+    elapsed = time.perf_counter() - start
+    n_nodes = sum(len(r.install.steps) + len(r.config.steps)
+                  for r in Recipes.recipes.values())
+    print(f"Recipes.init: {n_recipes} recipes, {n_nodes} steps in {elapsed:.3f}s "
+          f"({elapsed / n_nodes * 1e6:.2f}us per step)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,107 @@
-import shutil
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
 
-from setitup.utils.click import Context
+from setitup.models.context import Context
+
+
+class PathIndex:
+    """
+    Index of the executables on PATH, built once by listing each PATH directory.
+    Lookups only stat the candidates found in the index.
+    """
+
+    _index: Optional[Dict[str, List[str]]] = None
+    _key: List[Tuple[str, int]] = []
+    _path: str = ""
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _dirs(path: str) -> List[str]:
+        return list(dict.fromkeys(d for d in path.split(os.pathsep) if d))
+
+    @staticmethod
+    def _mtime(directory: str) -> int:
+        try:
+            return os.stat(directory).st_mtime_ns
+        except OSError:
+            return -1
+
+    @classmethod
+    def _build(cls) -> Dict[str, List[str]]:
+        with cls._lock:
+            if cls._index is not None:
+                return cls._index
+            path = Context.env.get("PATH", "")
+            index: Dict[str, List[str]] = {}
+            key: List[Tuple[str, int]] = []
+            for directory in cls._dirs(path):
+                key.append((directory, cls._mtime(directory)))
+                try:
+                    with os.scandir(directory) as entries:
+                        for entry in entries:
+                            index.setdefault(entry.name, []).append(directory)
+                except OSError:
+                    continue
+            cls._path, cls._key, cls._index = path, key, index
+            return index
+
+    @classmethod
+    def invalidate(cls) -> None:
+        with cls._lock:
+            cls._index = None
+
+    @classmethod
+    def refresh(cls) -> bool:
+        """
+        Drops the index if PATH or any PATH directory changed since it was built.
+
+        Returns:
+            bool: whether the index was dropped.
+        """
+        if cls._index is None:
+            return False
+        path = Context.env.get("PATH", "")
+        if path == cls._path and all(cls._mtime(d) == mtime for d, mtime in cls._key):
+            return False
+        cls.invalidate()
+        return True
+
+    @staticmethod
+    def _is_executable(file_path: str) -> bool:
+        return os.path.isfile(file_path) and os.access(file_path, os.X_OK)
+
+    @classmethod
+    def which(cls, cmd: str) -> Optional[str]:
+        """
+        Same as shutil.which, answered from the index.
+        """
+        if os.path.dirname(cmd):
+            return cmd if cls._is_executable(cmd) else None
+        for directory in cls._build().get(cmd, []):
+            file_path = str(Path(directory) / cmd)
+            if cls._is_executable(file_path):
+                return file_path
+        return None
+
+
+def which_many(cmds: Iterable[str]) -> Dict[str, Optional[str]]:
+    """
+    Looks up many commands against a single PATH index.
+
+    Args:
+        cmds (Iterable[str]): command names.
+
+    Returns:
+        Dict[str, Optional[str]]: path of each command, or None if not found.
+    """
+    return {cmd: PathIndex.which(cmd) for cmd in cmds}
 
 
 def is_installed(cmd: str) -> bool:
-    return (shutil.which(cmd) is not None) and not Context.force
+    return (PathIndex.which(cmd) is not None) and not Context.force
+
+
+def all_installed(*cmds: str) -> bool:
+    return all(path is not None for path in which_many(cmds).values()) and not Context.force
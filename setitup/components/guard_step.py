@@ -1,6 +1,6 @@
 from typing import Any, Dict, List
 
-from setitup.utils.click import Context
+from setitup.models.context import Context
 from setitup.utils.logging import log_step
 from setitup.utils.utils import is_string_list
 
@@ -17,12 +17,12 @@ class GuardStep(Step):
             self.run_step = all([eval(sub(item)) for item in conditions])
 
     @classmethod
-    def _from_dict(cls, context: Dict[str, Any], full_context: Dict[str, Any], path: List[str]) -> "GuardStep":
+    def _from_dict(cls, context: Dict[str, Any], path: List[str]) -> "GuardStep":
         return cls(context["conditions"])
 
     @staticmethod
     def _run(run_step: bool) -> None:
-        Context.run_step = run_step
+        Context.state.run_step = run_step
 
     def to_dict(self) -> str:
         return f"Guards: [{', '.join(self.conditions)}] => {'RUN' if self.run_step else 'SKIP'}"
@@ -2,7 +2,7 @@ from os import popen
 from typing import Any, Dict, List
 
 from setitup.models.steps import Step
-from setitup.utils.click import Context
+from setitup.models.context import Context
 from setitup.utils.logging import log_step
 
 
@@ -14,7 +14,7 @@ class ShellStep(Step):
         self.command = sub(command)
 
     @classmethod
-    def _from_dict(cls, context: Dict[str, Any], full_context: Dict[str, Any], path: List[str],) -> "ShellStep":
+    def _from_dict(cls, context: Dict[str, Any], path: List[str]) -> "ShellStep":
 
         return cls(context["command"])
 
@@ -31,4 +31,4 @@ class ShellStep(Step):
         return f"CMD: {self.command}"
 
     def run(self) -> str | None:
-        return log_step(f"{self}", Context.run_step)(self._run)(self.command)
+        return log_step(f"{self}", Context.state.run_step)(self._run)(self.command)
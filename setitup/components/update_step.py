@@ -16,7 +16,7 @@ class UpdateStep(Step):
         self.markers = markers
 
     @classmethod
-    def _from_dict(cls, context: Dict[str, Any], full_context: Dict[str, Any], path: List[str]) -> "UpdateStep":
+    def _from_dict(cls, context: Dict[str, Any], path: List[str]) -> "UpdateStep":
         return cls(context["source"], context["target"], context["sections"], context["markers"])
 
     @staticmethod
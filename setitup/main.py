@@ -1,40 +1,133 @@
+import atexit
+import json
+import re
+import time
 from pathlib import Path
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
 import click
 
-from setitup.models.recipes import Recipes, parse_recipes
-from setitup.models.settings import Settings, parse_settings
-from setitup.utils.click import AliasGroup, Context
-from setitup.utils.logging import (log_section, log_step, print_bold,
+from setitup.models.context import Context
+from setitup.utils.click import AliasGroup
+from setitup.utils.events import EventBus, JsonLinesSink
+from setitup.utils.logging import (log_section, log_unchanged, print_bold,
                                    print_yaml)
-from setitup.utils.parsing import parse_package
+from setitup.utils.profile import Profiler
+
+if TYPE_CHECKING:
+    from setitup.models.targets import Target
+
+# Models, parsers and the executor are imported by the commands that use them, so that
+# --help and shell hooks do not pay for them. See benchmarks/coldstart.py.
 
 
 @log_section("Parsing input directory...")
 def parse_directory(directory: str):
+    from setitup.models.catalog import load_catalog, save_catalog
+    from setitup.models.recipes import parse_recipes
+    from setitup.models.settings import parse_settings
+
     dir_path = Path(directory)
+    if Context.use_cache and load_catalog(dir_path):
+        log_unchanged("Parsing settings and recipes files")
+        return
     parse_settings(dir_path / "settings")
     parse_recipes(dir_path / "recipes")
+    if Context.use_cache:
+        save_catalog(dir_path)
 
 
 @click.group(cls=AliasGroup, context_settings=dict(help_option_names=["-h", "--help"]))
 @click.argument("directory")
-def main(directory: str):
+@click.option("--no-cache", is_flag=True, help="Ignore the compiled recipe catalog.")
+@click.option("--events", type=click.Path(dir_okay=False, path_type=Path),
+              help="Also append all events as JSON lines to this file.")
+@click.option("--profile", is_flag=True,
+              help="Print wall time, CPU time and child resource usage of each phase and step at exit.")
+@click.option("--trace", type=click.Path(dir_okay=False, path_type=Path),
+              help="Write the profile as a Chrome trace (also opened by speedscope). Implies --profile.")
+def main(directory: str, no_cache: bool, events: Optional[Path], profile: bool, trace: Optional[Path]):
     Context.base_directory = directory
+    Context.use_cache = not no_cache
+    if events is not None:
+        EventBus.add_sink(JsonLinesSink(events))
+    if profile or trace is not None:
+        Profiler.enable()
+        atexit.register(Profiler.report, trace)
+
+
+def jobs_option():
+    return click.option("-j", "--jobs", type=click.IntRange(min=1), default=1, show_default=True,
+                        help="Number of packages (or commands with --asyncio) to run in parallel.")
+
+
+def force_option():
+    return click.option("-f", "--force", is_flag=True,
+                        help="Run every step, even those that already succeeded with the same inputs.")
+
+
+def resume_option():
+    return click.option("--resume", is_flag=True,
+                        help="Continue the last failed run of the same packages from its failed steps.")
+
+
+def asyncio_option():
+    return click.option("--asyncio", "use_asyncio", is_flag=True,
+                        help="Run commands on an asyncio event loop. A failure cancels all other packages.")
+
+
+@log_section("Installing packages")
+def install_packages():
+    from setitup.utils.executor import run_packages
+    run_packages(Context.packages, "install",
+                 Context.jobs, Context.use_asyncio, Context.resume)
+
+
+@log_section("Configuring packages")
+def config_packages():
+    from setitup.utils.executor import run_packages
+    run_packages(Context.packages, "config",
+                 Context.jobs, Context.use_asyncio, Context.resume)
 
 
 @main.command(["i", "install"])
-def install():
-    pass
+@click.argument("package")
+@jobs_option()
+@asyncio_option()
+@force_option()
+@resume_option()
+def install(package: str, jobs: int, use_asyncio: bool, force: bool, resume: bool):
+    Context.jobs = jobs
+    Context.force = force
+    Context.resume = resume
+    Context.use_asyncio = use_asyncio
+    from setitup.utils.parsing import parse_package
+    parse_directory(Context.base_directory)
+    parse_package(package)
+    install_packages()
 
 
 @main.command(["c", "config"])
-def config():
-    pass
+@click.argument("package")
+@jobs_option()
+@asyncio_option()
+@force_option()
+@resume_option()
+def config(package: str, jobs: int, use_asyncio: bool, force: bool, resume: bool):
+    Context.jobs = jobs
+    Context.force = force
+    Context.resume = resume
+    Context.use_asyncio = use_asyncio
+    from setitup.utils.parsing import parse_package
+    parse_directory(Context.base_directory)
+    parse_package(package)
+    config_packages()
 
 
 @main.command(["l", "ls", "list"])
 def ls():
+    from setitup.models.recipes import Recipes
+    from setitup.models.settings import Settings
     parse_directory(Context.base_directory)
     installable = []
     configurable = []
@@ -54,16 +147,94 @@ def ls():
         print(f"{k}: {', '.join(v)}")
 
 
-@log_section("Dry run")
-def dry_run_packages():
-    for package in Context.packages:
-        log_step(f"Dry run for {package}", True)(
-            print_yaml)(Recipes.recipes[package].to_dict())
+@log_section("Parsing targets")
+def parse_target_file(targets_file: Path) -> List["Target"]:
+    from setitup.models.targets import parse_targets
+    return parse_targets(targets_file)
+
+
+@log_section("Running targets")
+def run_target_packages(targets: List["Target"], phase: str, jobs: int, log_dir: Path):
+    from setitup.utils.targets import run_targets
+    run_targets(targets, Context.packages, phase, jobs, log_dir)
+
+
+@main.command(["t", "targets"], help="Run a package or bundle for many home directories or prefixes.")
+@click.argument("targets_file", type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.argument("package")
+@click.option("--phase", type=click.Choice(["install", "config"]), default="config", show_default=True)
+@click.option("-j", "--jobs", type=click.IntRange(min=1), default=4, show_default=True,
+              help="Number of targets to run in parallel.")
+@click.option("--logs", "log_dir", type=click.Path(file_okay=False, path_type=Path),
+              help="Directory of the per-target logs. Defaults to targets/ in the state directory.")
+@force_option()
+@resume_option()
+def targets(targets_file: Path, package: str, phase: str, jobs: int, log_dir: Optional[Path], force: bool, resume: bool):
+    Context.force = force
+    Context.resume = resume
+    from setitup.utils.parsing import parse_package
+    parse_directory(Context.base_directory)
+    parse_package(package)
+    run_target_packages(parse_target_file(targets_file), phase, jobs,
+                        log_dir or Context.state_dir / "targets")
+
+
+@log_section("Planning")
+def plan_packages(phase: str, json_path: Optional[Path]):
+    from setitup.utils.plan import build_plan, print_plan
+    plan = build_plan(Context.packages, phase)
+    print_plan(plan)
+    if json_path is not None:
+        json_path.write_text(json.dumps(plan, indent=2))
 
 
-@main.command(["dry", "drydry"], help="wee")
+@main.command(["dry", "drydry"], help="Show the execution plan without running anything.")
 @click.argument("package")
-def dry(package: str):
+@click.option("--phase", type=click.Choice(["install", "config"]), default="install", show_default=True)
+@click.option("--json", "json_path", type=click.Path(dir_okay=False, path_type=Path),
+              help="Also write the plan as JSON to this file.")
+def dry(package: str, phase: str, json_path: Optional[Path]):
+    from setitup.utils.parsing import parse_package
     parse_directory(Context.base_directory)
     parse_package(package)
-    dry_run_packages()
+    plan_packages(phase, json_path)
+
+
+WINDOW_UNITS = {"m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def parse_window(ctx: click.Context, param: click.Parameter, value: str) -> float:
+    match = re.fullmatch(r"(\d+)([mhdw])", value)
+    if match is None:
+        raise click.BadParameter(
+            "expected a number followed by m, h, d or w, e.g. 7d")
+    return int(match.group(1)) * WINDOW_UNITS[match.group(2)]
+
+
+def _fmt_rate(rate: float) -> str:
+    return f"{rate * 100:.0f}%"
+
+
+@main.command(["stats"], help="Show step durations and failure rates of past runs.")
+@click.option("--since", "window", default="30d", show_default=True, callback=parse_window,
+              help="Time window, e.g. 12h, 7d or 4w.")
+@click.option("-p", "--package", "packages", multiple=True, help="Only report these packages.")
+@click.option("--top", type=click.IntRange(min=1), default=5, show_default=True,
+              help="Number of slowest steps per package.")
+@click.option("--json", "json_path", type=click.Path(dir_okay=False, path_type=Path),
+              help="Also write the statistics as JSON to this file.")
+def stats(window: float, packages: Tuple[str, ...], top: int, json_path: Optional[Path]):
+    from setitup.utils.history import History
+    report = History.stats(time.time() - window, list(packages), top)
+    if not report:
+        print("No runs recorded in this window.")
+    for package, info in report.items():
+        print_bold(f"[{package}]", color="yellow")
+        print(f"  {info['runs']} runs, p50 {info['p50']:.1f}s, p95 {info['p95']:.1f}s, "
+              f"{_fmt_rate(info['failure_rate'])} failed")
+        print(f"  {'p50(s)':>8} {'p95(s)':>8} {'runs':>5} {'failed':>7}  step")
+        for step in info["slowest_steps"]:
+            print(f"  {step['p50']:8.2f} {step['p95']:8.2f} {step['runs']:5} "
+                  f"{_fmt_rate(step['failure_rate']):>7}  #{step['index']} {step['step']}")
+    if json_path is not None:
+        json_path.write_text(json.dumps(report, indent=2))
@@ -0,0 +1,127 @@
+import hashlib
+import pickle
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from setitup.models.context import Context
+from setitup.models.recipes import Recipes
+from setitup.models.settings import Settings
+from setitup.utils.profile import profiled
+
+# Modules besides setitup.models that decide what a parsed catalog holds
+CATALOG_SOURCES = ["utils/templates.py", "utils/guards.py", "utils/utils.py"]
+
+FileKey = Tuple[str, int, int]
+
+# ---------------------------------------------------------------------------- #
+#                                Catalog Cache                                 #
+# ---------------------------------------------------------------------------- #
+
+
+@lru_cache(maxsize=None)
+def catalog_version() -> str:
+    """
+    Digest of the sources of setitup.models, which define the pickled classes and how recipes
+    are validated, and of CATALOG_SOURCES, which merge, substitute and check them. Catalogs
+    compiled by any other version of setitup are not loaded.
+    """
+    package = Path(__file__).parent.parent
+    digest = hashlib.sha256()
+    for source in sorted(Path(__file__).parent.glob("*.py")) + [package / name for name in CATALOG_SOURCES]:
+        digest.update(str(source.relative_to(package)).encode())
+        digest.update(source.read_bytes())
+    return digest.hexdigest()
+
+
+def catalog_path(dir_path: Path) -> Path:
+    """
+    Compiled catalog of an input directory, under the cache directory so that recipe
+    directories are never written to.
+    """
+    digest = hashlib.sha256(str(dir_path.resolve()).encode()).hexdigest()[:16]
+    return Context.cache_dir / "catalogs" / f"{digest}.pickle"
+
+
+def catalog_key(dir_path: Path) -> List[FileKey]:
+    """
+    Identifies the input files of a directory by path, mtime and size.
+
+    Args:
+        dir_path (Path): input directory with settings and recipes subdirectories.
+
+    Returns:
+        List[FileKey]: sorted (path, mtime_ns, size) of every toml file.
+    """
+    files = list((dir_path / "settings").glob("*.toml")) + \
+        list((dir_path / "recipes").glob("*.toml"))
+    key: List[FileKey] = []
+    for file_path in files:
+        stat = file_path.stat()
+        key.append((str(file_path.resolve()), stat.st_mtime_ns, stat.st_size))
+    return sorted(key)
+
+
+@profiled("load_catalog")
+def load_catalog(dir_path: Path) -> bool:
+    """
+    Restores Settings and Recipes from the compiled catalog if no input file changed.
+    Templates of the restored steps are substituted again, as parsing would, and the
+    catalog is not used if any of them fails.
+
+    Args:
+        dir_path (Path): input directory.
+
+    Returns:
+        bool: whether the catalog was loaded.
+    """
+    cache_path = catalog_path(dir_path)
+    if not cache_path.is_file():
+        return False
+    try:
+        with open(cache_path, "rb") as f:
+            catalog: Dict[str, Any] = pickle.load(f)
+    except Exception:
+        return False
+    if catalog.get("version") != catalog_version() or catalog.get("key") != catalog_key(dir_path):
+        return False
+
+    Settings.root = catalog["settings"]["root"]
+    Settings.bundles = catalog["settings"]["bundles"]
+    Settings._initialized = True
+    try:
+        for recipe in catalog["recipes"].values():
+            for spec in (recipe.install, recipe.config):
+                for step in spec.steps if spec is not None else []:
+                    step.check()
+    except Exception:
+        Settings._initialized = False
+        return False
+    Recipes.recipes = catalog["recipes"]
+    Recipes._initialized = True
+    return True
+
+
+def save_catalog(dir_path: Path) -> None:
+    """
+    Writes the validated Settings and Recipes as a compiled catalog. Failures are ignored,
+    e.g. when the cache directory is read-only.
+
+    Args:
+        dir_path (Path): input directory.
+    """
+    catalog = {
+        "version": catalog_version(),
+        "key": catalog_key(dir_path),
+        "settings": {"root": Settings.root, "bundles": Settings.bundles},
+        "recipes": Recipes.recipes,
+    }
+    cache_path = catalog_path(dir_path)
+    tmp_path = cache_path.with_suffix(".tmp")
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            pickle.dump(catalog, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_path.replace(cache_path)
+    except OSError:
+        tmp_path.unlink(missing_ok=True)
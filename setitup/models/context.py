@@ -1,4 +1,5 @@
 import atexit
+from contextvars import ContextVar
 from os import environ
 from pathlib import Path
 from shutil import rmtree
@@ -24,14 +25,40 @@ class DotDict(StringDict):
 ENV = dict(environ)
 
 
+class StepState:
+    """
+    Step state local to the current thread or asyncio task, so that packages running
+    concurrently do not see each other's guards.
+    """
+    _run_step: ContextVar[bool] = ContextVar("run_step", default=True)
+
+    @property
+    def run_step(self) -> bool:
+        return self._run_step.get()
+
+    @run_step.setter
+    def run_step(self, value: bool) -> None:
+        self._run_step.set(value)
+
+
 class Context:
     base_directory: str = ""
     packages: List[str] = []
     force: bool = False
     verbose: bool = False
-    run_step: bool = True
+    jobs: int = 1
+    use_asyncio: bool = False
+    resume: bool = False
+    use_cache: bool = True
+    state: StepState = StepState()
     env: Dict[str, str] = ENV
     homr_dir: Path = Path(ENV["HOME"])
+    state_dir: Path = Path(ENV.get("XDG_STATE_HOME", Path(
+        ENV["HOME"]) / ".local" / "state")) / "setitup"
+    cache_dir: Path = Path(ENV.get("XDG_CACHE_HOME", Path(
+        ENV["HOME"]) / ".cache")) / "setitup"
+    # Least recently used downloads are evicted beyond this size
+    fetch_cache_bytes: int = 2 * 1024 ** 3
     tmp_dir: Path = Path(mkdtemp())
 
     @staticmethod
@@ -1,5 +1,7 @@
-from typing import (Any, Callable, Dict, Iterable, List, Optional, Tuple, Type,
-                    TypeVar)
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import (Any, Callable, Dict, Iterable, Iterator, List, Optional,
+                    Tuple, Type, TypeVar)
 
 from setitup.utils.logging import fmt_yaml
 
@@ -15,83 +17,99 @@ def splitfy(stuff: str | Iterable[str], delimiter: str) -> List[str]:
 KeySpec = Tuple[str, type | Callable[..., bool] | None]
 
 
-def check_dict(
-    context: Dict[str, Any],
-    path: List[str],
-    key_specs: List[KeySpec],
-) -> Dict[str, Any]:
-    # Tidy up path
-    full_path_str = ".".join(path)
+class DictError:
+    """
+    A single validation error. The offending context is only rendered as YAML when printed.
+    """
 
-    # Check path to current context
-    curr_context: Dict[str, Any] | List[Any] = context
-    for i, key in enumerate(path):
-        # Parse numeric key
-        try:
-            key_int = int(key)
-        except Exception:
-            key_int = -1
-
-        # When current context is dict
-        if isinstance(curr_context, dict) and key in curr_context:
-            curr_context = curr_context[key]
-        # When current context is list
-        elif isinstance(curr_context, list) and key_int >= 0 and len(curr_context) > key_int:
-            curr_context = curr_context[key_int]
-        else:
-            curr_path_str = ".".join(path[: i + 1])
-            raise KeyError(
-                [
-                    f"Error looking for value at path {full_path_str}",
-                    f"Stopped at {curr_path_str}",
-                    "Current Context:",
-                    fmt_yaml(curr_context),
-                    "Context:",
-                    fmt_yaml(context),
-                ]
-            )
-
-    # Cannot stop at list
-    if isinstance(curr_context, list):
-        raise ValueError(
-            [
-                f"List found at path {full_path_str}",
-                "Current Context:",
-                fmt_yaml(curr_context),
-                "Context:",
-                fmt_yaml(context),
-            ]
-        )
-
-    # Check keys at current context
+    def __init__(self, message: str, path: List[str], context: Any) -> None:
+        self.message = message
+        self.path = path
+        self.context = context
+
+    def __str__(self) -> str:
+        return "\n".join([f"{self.message} at path {'.'.join(self.path) or '<root>'}",
+                          "Current Context:", fmt_yaml(self.context)])
+
+
+class ValidationError(ValueError):
+    """
+    All errors found while validating a dictionary.
+    """
+
+    def __init__(self, errors: List[DictError], title: Optional[str] = None) -> None:
+        super().__init__(([title] if title else []) + errors)
+        self.errors = errors
+
+
+_errors: ContextVar[Optional[List[DictError]]] = ContextVar(
+    "errors", default=None)
+
+
+@contextmanager
+def collect_errors() -> Iterator[List[DictError]]:
+    """
+    Collects validation errors instead of raising on the first one.
+
+    Yields:
+        Iterator[List[DictError]]: errors found so far.
+    """
+    errors: List[DictError] = []
+    token = _errors.set(errors)
+    try:
+        yield errors
+    finally:
+        _errors.reset(token)
+
+
+def report_error(message: str, path: List[str], context: Any) -> None:
+    """
+    Records a validation error, or raises it if errors are not being collected.
+    """
+    error = DictError(message, path, context)
+    errors = _errors.get()
+    if errors is None:
+        raise ValidationError([error])
+    errors.append(error)
+
+
+def check_dict(context: Any, path: List[str], key_specs: List[KeySpec]) -> bool:
+    """
+    Checks the keys of a single node. The node is passed directly, so validating a tree
+    takes a single pass.
+
+    Args:
+        context (Any): node to check.
+        path (List[str]): path of the node, for error messages.
+        key_specs (List[KeySpec]): required keys with their type or validator.
+
+    Returns:
+        bool: whether the node is valid. Errors are reported through report_error.
+    """
+    if not isinstance(context, dict):
+        report_error(
+            f"Expected table but found {type(context).__name__}", path, context)
+        return False
+
+    valid = True
     for key, key_type in key_specs:
-        if key not in curr_context:
-            raise KeyError(
-                [
-                    f"Error looking for key {key} at path {full_path_str}",
-                    "Current Context:",
-                    fmt_yaml(curr_context),
-                    "Context:",
-                    fmt_yaml(context),
-                ]
-            )
-
-        failed_type = key_type and isinstance(
-            key_type, type) and not isinstance(curr_context[key], key_type)
-        failed_validator = key_type and not isinstance(
-            key_type, type) and not key_type(curr_context[key])
-        if failed_type or failed_validator:
-            raise ValueError(
-                [
-                    f"Invalid value {curr_context[key]} at path {full_path_str} => {key}",
-                    "Current Context:",
-                    fmt_yaml(curr_context),
-                    "Context:",
-                    fmt_yaml(context),
-                ]
-            )
-
-    return curr_context
+        if key not in context:
+            report_error(f"Missing key {key}", path, context)
+            valid = False
+            continue
+
+        value = context[key]
+        if key_type is None:
+            continue
+        if isinstance(key_type, type):
+            failed = not isinstance(value, key_type)
+        else:
+            failed = not key_type(value)
+        if failed:
+            report_error(f"Invalid value {value} for key {key}", path, context)
+            valid = False
+
+    return valid
 
 
 S = TypeVar("S", bound="DictObject")
@@ -102,22 +120,34 @@ class DictObject:
     dict_keys: List[KeySpec] = []
 
     @classmethod
-    def _from_dict(cls: Type[S], context: Dict[str, Any], full_context: Dict[str, Any], path: List[str] = []) -> S:
+    def _from_dict(cls: Type[S], context: Dict[str, Any], path: List[str]) -> S:
         raise NotImplementedError(f"{cls.__name__}.from_dict not implemented")
 
     @classmethod
-    def from_dict(cls: Type[S], full_context: Dict[str, Any], path: List[str] = []) -> S:
+    def from_dict(cls: Type[S], context: Any, path: List[str] = []) -> Optional[S]:
+        """
+        Validates a node and constructs an instance from it. Children are constructed from
+        their own nodes in the same pass.
+
+        Args:
+            context (Any): node to construct from.
+            path (List[str], optional): path of the node, for error messages. Defaults to [].
+
+        Returns:
+            Optional[S]: instance, or None if the node is invalid and errors are being collected.
+        """
+        if not check_dict(context, path, cls.dict_keys):
+            return None
         try:
-            sub_context = check_dict(full_context, path, cls.dict_keys)
-            instance: S = cls._from_dict(sub_context, full_context, path)
+            return cls._from_dict(context, path)
+        except ValidationError:
+            raise
         except Exception as e:
-            if isinstance(e.args[0], list):
-                raise type(e)(
-                    [f"Error constructing {cls.__name__} from dict"] + e.args[0])
-            else:
-                raise type(e)(
-                    [f"Error constructing {cls.__name__} from dict"] + list(e.args))
-        return instance
+            messages = e.args[0] if e.args and isinstance(
+                e.args[0], list) else [str(e)]
+            report_error(
+                f"Error constructing {cls.__name__} from dict: {': '.join(map(str, messages))}", path, context)
+            return None
 
     def to_dict(self) -> Dict[str, Any] | str:
         raise NotImplementedError(f"{self.__class__}.to_dict not implemented")
@@ -132,22 +162,25 @@ class DictSingleton:
     dict_keys: List[KeySpec] = []
 
     @classmethod
-    def _init(cls, context: Dict[str, Any], full_context: Dict[str, Any], path: List[str] = []) -> None:
+    def _init(cls, context: Dict[str, Any], path: List[str] = []) -> None:
         raise NotImplementedError(f"{cls.__name__}._init not implemented")
 
     @classmethod
-    def init(cls, full_context: Dict[str, Any], path: List[str] = []) -> None:
-        try:
-            sub_context = check_dict(full_context, path, cls.dict_keys)
-            cls._init(sub_context, full_context, path)
-            cls._initialized = True
-        except Exception as e:
-            if isinstance(e.args[0], list):
-                raise type(e)(
-                    [f"Error updating {cls.__name__} from dict"] + e.args[0])
-            else:
-                raise type(e)(
-                    [f"Error updating {cls.__name__} from dict"] + list(e.args))
+    def init(cls, context: Dict[str, Any], path: List[str] = []) -> None:
+        """
+        Validates the whole dictionary in a single pass and raises all errors at once.
+
+        Args:
+            context (Dict[str, Any]): dictionary to initialize from.
+            path (List[str], optional): path of the dictionary, for error messages. Defaults to [].
+        """
+        with collect_errors() as errors:
+            if check_dict(context, path, cls.dict_keys):
+                cls._init(context, path)
+        if errors:
+            raise ValidationError(
+                errors, f"Error updating {cls.__name__} from dict ({len(errors)} errors)")
+        cls._initialized = True
 
     @classmethod
     def ok(cls, item: Optional[T]) -> T:
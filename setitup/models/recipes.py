@@ -1,10 +1,13 @@
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
-from setitup.models.dict_objects import DictObject, DictSingleton
+from setitup.models.dict_objects import (DictObject, DictSingleton,
+                                         report_error)
 from setitup.models.steps import Step
 from setitup.utils.io import read_local_tomls
 from setitup.utils.logging import log_step
+from setitup.utils.profile import profiled
+from setitup.utils.utils import is_string_list
 
 
 class InstallSpec(DictObject):
@@ -15,8 +18,8 @@ class InstallSpec(DictObject):
         self.steps = steps
 
     @classmethod
-    def _from_dict(cls, context: Dict[str, Any], full_context: Dict[str, Any], path: List[str]) -> "InstallModel":
-        return cls([Step.from_dict(full_context, path + ["steps", str(i)]) for i, _ in enumerate(context["steps"])])
+    def _from_dict(cls, context: Dict[str, Any], path: List[str]) -> "InstallSpec":
+        return cls([Step.from_dict(step, path + ["steps", str(i)]) for i, step in enumerate(context["steps"])])
 
     def to_dict(self) -> Dict[str, Any]:
         return {"steps": [item.to_dict() for item in self.steps]}
@@ -30,8 +33,8 @@ class ConfigSpec(DictObject):
         self.steps = steps
 
     @classmethod
-    def _from_dict(cls, context: Dict[str, Any], full_context: Dict[str, Any], path: List[str]) -> "ConfigSpec":
-        return cls([Step.from_dict(full_context, path + ["steps", str(i)]) for i, _ in enumerate(context["steps"])])
+    def _from_dict(cls, context: Dict[str, Any], path: List[str]) -> "ConfigSpec":
+        return cls([Step.from_dict(step, path + ["steps", str(i)]) for i, step in enumerate(context["steps"])])
 
     def to_dict(self) -> Dict[str, Any]:
         return {"steps": [item.to_dict() for item in self.steps]}
@@ -40,25 +43,36 @@ class ConfigSpec(DictObject):
 class Recipe(DictObject):
     install: Optional[InstallSpec]
     config: Optional[ConfigSpec]
+    depends: List[str]
 
     dict_keys = []
 
-    def __init__(self, install: Optional[InstallSpec], config: Optional[ConfigSpec]) -> None:
+    def __init__(self, install: Optional[InstallSpec], config: Optional[ConfigSpec], depends: List[str] = []) -> None:
         self.install = install
         self.config = config
+        self.depends = depends
 
     @classmethod
-    def _from_dict(cls, context: Dict[str, Any], full_context: Dict[str, Any], path: List[str]) -> "Recipe":
+    def _from_dict(cls, context: Dict[str, Any], path: List[str]) -> "Recipe":
+        depends = context.get("depends", [])
+        if not is_string_list(depends):
+            report_error(
+                f"Invalid value {depends} for key depends", path, context)
+            depends = []
         return cls(
             InstallSpec.from_dict(
-                full_context, path + ["install"]) if "install" in context else None,
-            ConfigSpec.from_dict(full_context, path +
-                                 ["config"]) if "config" in context else None,
+                context["install"], path + ["install"]) if "install" in context else None,
+            ConfigSpec.from_dict(
+                context["config"], path + ["config"]) if "config" in context else None,
+            depends,
         )
 
     def to_dict(self) -> Dict[str, Any]:
         res: Dict[str, Any] = {}
 
+        if self.depends:
+            res["depends"] = self.depends
+
         if self.install:
             res["install"] = self.install.to_dict()
 
@@ -72,9 +86,9 @@ class Recipes(DictSingleton):
     recipes: Dict[str, Recipe] = {}
 
     @classmethod
-    def _init(cls, context: Dict[str, Any], full_context: Dict[str, Any], path: List[str] = []) -> None:
+    def _init(cls, context: Dict[str, Any], path: List[str] = []) -> None:
         cls.recipes = {k: Recipe.from_dict(
-            context, [k]) for k in context.keys()}
+            v, path + [k]) for k, v in context.items()}
 
     @classmethod
     def to_dict(cls) -> Dict[str, Any]:
@@ -82,8 +96,10 @@ class Recipes(DictSingleton):
 
 
 @log_step("Parsing recipes files", True)
+@profiled("parse_recipes")
 def parse_recipes(recipes_path: Path) -> None:
     assert recipes_path.exists() and recipes_path.is_dir(
     ), f"path to recipes directory is invalid ({recipes_path})"
-    recipe_files = recipes_path.glob("*.toml")
-    Recipes.init(read_local_tomls(recipe_files))
+    # Steps of a package spread over several files are concatenated
+    recipe_files = sorted(recipes_path.glob("*.toml"))
+    Recipes.init(read_local_tomls(recipe_files, lists="append"))
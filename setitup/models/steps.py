@@ -1,77 +1,166 @@
-from os import popen
+import hashlib
+import json
 from shutil import Error
-from typing import Any, Callable, Dict, List, Literal
+from typing import TYPE_CHECKING, Any, Dict, List, Literal, Optional
 
-from setitup.models.dict_objects import DictObject
-from setitup.models.settings import Settings
-from setitup.utils.click import Context
-from setitup.utils.logging import log_step
-from setitup.utils.utils import is_string_list
+from setitup.models.dict_objects import DictObject, report_error
+from setitup.models.context import Context
+from setitup.utils.guards import GuardResults, compile_guard
+from setitup.utils.io import copy_atomic, hash_file, overwrite, resolve_path
+from setitup.utils.logging import log_step, log_step_async
+from setitup.utils.process import (CommandError, CommandResult,
+                                   run_command, run_command_async)
+from setitup.utils.rc import (DEFAULT_MARKERS, RcFile, flush_rc, load_rc,
+                              update_rc)
+from setitup.utils.utils import is_string_list, sub
 
-StringDict = dict[str, str]
+if TYPE_CHECKING:
+    import asyncio
 
-
-class DotDict(StringDict):
-    __getattr__: Callable[..., str | None] = StringDict.get
-    __setattr__: Callable[..., None] = StringDict.__setitem__
-    __delattr__: Callable[..., None] = StringDict.__delitem__
-
-
-def sub(line: str) -> str:
-    return line.format(settings=Settings, context=Context, env=DotDict(Context.env))
+# Environment variables that change what a command does without appearing in it
+FINGERPRINT_ENV = ["HOME", "PATH", "USER"]
 
 
 class Step(DictObject):
 
     dict_keys = [
-        ("kind", lambda x: x in ["shell", "guard", "overwrite", "update"])]
+        ("kind", lambda x: x in ["shell", "guard", "overwrite", "update", "fetch", "git"])]
 
     @classmethod
-    def _from_dict(cls, context: Dict[str, Any], full_context: Dict[str, Any], path: List[str]) -> "Step":
+    def _from_dict(cls, context: Dict[str, Any], path: List[str]) -> "Step":
         kind: Literal["shell", "guard",
-                      "overwrite", "update"] = context["kind"]
+                      "overwrite", "update", "fetch", "git"] = context["kind"]
         match kind:
             case "shell":
-                return ShellStep.from_dict(full_context, path)
+                return ShellStep.from_dict(context, path)
             case "guard":
-                return GuardStep.from_dict(full_context, path)
+                return GuardStep.from_dict(context, path)
             case "overwrite":
-                return OverwriteStep.from_dict(full_context, path)
+                return OverwriteStep.from_dict(context, path)
             case "update":
-                return UpdateStep.from_dict(full_context, path)
+                return UpdateStep.from_dict(context, path)
+            case "fetch":
+                return FetchStep.from_dict(context, path)
+            case "git":
+                return GitStep.from_dict(context, path)
             case _:
                 raise Error("Something is very wrong")
 
+    # Attributes holding unsubstituted templates
+    templates: List[str] = []
+
+    def check(self) -> None:
+        """
+        Substitutes the templates of the step once, so that unknown fields fail while parsing,
+        not while running. Also run on steps restored from the compiled catalog.
+        """
+        for name in self.templates:
+            sub(getattr(self, name))
+
     def run(self) -> Any:
         raise NotImplementedError(f"{self.__class__}.run not implemented")
 
+    def prefetch(self) -> None:
+        """
+        Starts slow work that does not depend on earlier steps, before the packages run.
+        """
+        pass
+
+    def fingerprint(self) -> Optional[str]:
+        """
+        Hash of the substituted step and its inputs, used to skip steps that already succeeded.
+        None for steps that should always run.
+        """
+        return None
+
+    def _fingerprint(self, *parts: str) -> str:
+        digest = hashlib.sha256(self.__class__.__name__.encode())
+        # The temporary directory is created per process, its path must not change the hash
+        tmp_dir = str(Context.tmp_dir)
+        for part in parts + tuple(f"{key}={Context.env.get(key, '')}" for key in FINGERPRINT_ENV):
+            digest.update(b"\0" + part.replace(tmp_dir, "{context.tmp_dir}").encode())
+        return digest.hexdigest()
+
+    def identity(self) -> str:
+        """
+        Hash of the step as written in its recipe, before substitution. Unlike its name, it is
+        the same in every process, even for steps that refer to context.tmp_dir.
+        """
+        raw = json.dumps(vars(self), sort_keys=True, default=str)
+        return hashlib.sha256(f"{self.__class__.__name__}\0{raw}".encode()).hexdigest()[:16]
+
+    async def run_async(self, limit: "asyncio.Semaphore") -> Any:
+        """
+        Runs the step inside an asyncio task. Steps without subprocesses run inline.
+
+        Args:
+            limit (asyncio.Semaphore): global limit on concurrently running commands.
+        """
+        return self.run()
+
+    def __str__(self) -> str:
+        return str(self.to_dict())
+
 
 class ShellStep(Step):
 
     dict_keys = [("command", str)]
 
-    def __init__(self, command: str) -> None:
-        self.command = sub(command)
+    templates = ["_command"]
 
-    @classmethod
-    def _from_dict(cls, context: Dict[str, Any], full_context: Dict[str, Any], path: List[str],) -> "ShellStep":
+    def __init__(self, command: str, timeout: Optional[float] = None) -> None:
+        self._command = command
+        self.timeout = timeout
+        self.check()
+
+    @property
+    def command(self) -> str:
+        return sub(self._command)
 
-        return cls(context["command"])
+    @classmethod
+    def _from_dict(cls, context: Dict[str, Any], path: List[str]) -> "ShellStep":
+        timeout = context.get("timeout")
+        if timeout is not None and (isinstance(timeout, bool) or not isinstance(timeout, (int, float)) or timeout <= 0):
+            report_error(
+                f"Invalid value {timeout} for key timeout", path, context)
+            timeout = None
+        return cls(context["command"], timeout)
 
     @staticmethod
-    def _run(cmd: str) -> str:
-        proc = popen(cmd)
-        log = proc.read()
-        status = proc.close()
-        if status is not None:
-            raise Exception(log, status)
-        return log
+    def _check(result: CommandResult, timeout: Optional[float]) -> None:
+        if result.timed_out:
+            raise CommandError(
+                [f"Timed out after {timeout}s. Last {len(result.tail)} lines of output:"] + result.tail, result.status)
+        if not result.ok:
+            raise CommandError(
+                [f"Exit status {result.status}. Last {len(result.tail)} lines of output:"] + result.tail, result.status)
+
+    @classmethod
+    def _run(cls, cmd: str, timeout: Optional[float]) -> None:
+        cls._check(run_command(cmd, stream=Context.verbose,
+                   timeout=timeout), timeout)
+
+    @classmethod
+    async def _run_async(cls, cmd: str, timeout: Optional[float], limit: "asyncio.Semaphore") -> None:
+        async with limit:
+            result = await run_command_async(cmd, stream=Context.verbose, timeout=timeout)
+        cls._check(result, timeout)
+
+    def fingerprint(self) -> Optional[str]:
+        return self._fingerprint(self.command)
 
     def to_dict(self) -> str:
+        if self.timeout is not None:
+            return f"CMD: {self.command} (timeout: {self.timeout}s)"
         return f"CMD: {self.command}"
 
-    def run(self) -> str | None:
-        return log_step(f"{self}", Context.run_step)(self._run)(self.command)
+    def run(self) -> None:
+        log_step(f"{self}", Context.state.run_step)(
+            self._run)(self.command, self.timeout)
+
+    async def run_async(self, limit: "asyncio.Semaphore") -> None:
+        await log_step_async(f"{self}", Context.state.run_step)(
+            self._run_async)(self.command, self.timeout, limit)
 
 
 class GuardStep(Step):
@@ -80,47 +169,74 @@ class GuardStep(Step):
 
     def __init__(self, conditions: List[str]) -> None:
         self.conditions = conditions
-        if len(self.conditions) == 0:
-            self.run_step = True
-        else:
-            self.run_step = all([eval(sub(item)) for item in conditions])
+        self.check()
+
+    def check(self) -> None:
+        # Compiled once to fail early on invalid guards
+        for item in self.conditions:
+            compile_guard(sub(item))
+
+    @property
+    def run_step(self) -> bool:
+        # Evaluated lazily, stopping at the first false condition
+        return all(GuardResults.evaluate(sub(item)) for item in self.conditions)
 
     @classmethod
-    def _from_dict(cls, context: Dict[str, Any], full_context: Dict[str, Any], path: List[str]) -> "GuardStep":
+    def _from_dict(cls, context: Dict[str, Any], path: List[str]) -> "GuardStep":
         return cls(context["conditions"])
 
     @staticmethod
     def _run(run_step: bool) -> None:
-        Context.run_step = run_step
+        Context.state.run_step = run_step
 
     def to_dict(self) -> str:
-        return f"Guards: [{', '.join(self.conditions)}] => {'RUN' if self.run_step else 'SKIP'}"
+        # Naming a guard must not evaluate it, see run
+        return f"Guards: [{', '.join(self.conditions)}]"
 
     def run(self) -> None:
-        log_step(f"{self}", True)(self._run)(self.run_step)
+        run_step = self.run_step
+        log_step(f"{self} => {'RUN' if run_step else 'SKIP'}", True)(
+            self._run)(run_step)
 
 
 class OverwriteStep(Step):
 
     dict_keys = [("source", str), ("target", str)]
 
+    templates = ["_source", "_target"]
+
     def __init__(self, source: str, target: str) -> None:
-        self.source = sub(source)
-        self.target = sub(target)
+        self._source = source
+        self._target = target
+        self.check()
+
+    @property
+    def source(self) -> str:
+        return sub(self._source)
+
+    @property
+    def target(self) -> str:
+        return sub(self._target)
 
     @classmethod
-    def _from_dict(cls, context: Dict[str, Any], full_context: Dict[str, Any], path: List[str]) -> "OverwriteStep":
+    def _from_dict(cls, context: Dict[str, Any], path: List[str]) -> "OverwriteStep":
         return cls(context["source"], context["target"])
 
     @staticmethod
-    def _run(source: str, target: str) -> None:
-        pass
+    def _run(source: str, target: str) -> str:
+        written, total = overwrite(resolve_path(source), resolve_path(target))
+        return f"{written} of {total} files written"
+
+    def fingerprint(self) -> Optional[str]:
+        # Checking the ledger would hash the same files that _run compares, and miss edits of the target
+        return None
 
     def to_dict(self) -> str:
         return f"Overwrite: {self.target} with {self.source}"
 
     def run(self) -> None:
-        log_step(f"{self}", True)(self._run)(self.source, self.target)
+        log_step(f"{self}", Context.state.run_step)(
+            self._run)(self.source, self.target)
 
 
 class UpdateStep(Step):
@@ -128,22 +244,190 @@ class UpdateStep(Step):
     dict_keys = [("source", str), ("target", str),
                  ("sections", is_string_list), ("markers", is_string_list)]
 
+    templates = ["_source", "_target"]
+
     def __init__(self, source: str, target: str, sections: List[str], markers: List[str]) -> None:
-        self.source = sub(source)
-        self.target = sub(target)
+        self._source = source
+        self._target = target
         self.sections = sections
         self.markers = markers
+        self.check()
+
+    @property
+    def source(self) -> str:
+        return sub(self._source)
+
+    @property
+    def target(self) -> str:
+        return sub(self._target)
 
     @classmethod
-    def _from_dict(cls, context: Dict[str, Any], full_context: Dict[str, Any], path: List[str]) -> "UpdateStep":
-        return cls(context["source"], context["target"], context["sections"], context["markers"])
+    def _from_dict(cls, context: Dict[str, Any], path: List[str]) -> "UpdateStep":
+        markers = context["markers"]
+        if len(markers) not in (0, 2) or (markers and (not all(markers) or markers[0] == markers[1])):
+            report_error(
+                f"Invalid value {markers} for key markers, expected [] or distinct non-empty start and end markers",
+                path, context)
+            markers = []
+        return cls(context["source"], context["target"], context["sections"], markers)
 
     @staticmethod
-    def _run(source: str, target: str) -> None:
-        pass
+    def _run(source: str, target: str, sections: List[str], markers: List[str]) -> str:
+        marker_pair = (markers[0], markers[1]) if markers else DEFAULT_MARKERS
+        template = load_rc(resolve_path(source), marker_pair)
+        names = sections or [
+            section for section in template.sections if not section.startswith("none")]
+        missing = [name for name in names if name not in template.content]
+        if missing:
+            raise ValueError(
+                [f"Missing sections in {source}", ", ".join(missing)])
+
+        # Only sections whose hash differs are handed to the rc transaction. Template digests
+        # are cached by load_rc. The file is written before the step returns, so the journal
+        # never records an update that was not written.
+        target_path = resolve_path(target)
+        current = RcFile(target_path.read_text().splitlines() if target_path.is_file() else [],
+                         marker_pair)
+        changed = current.changed_sections(template, names)
+        if changed:
+            update_rc(template.select(changed), target_path)
+            flush_rc(target_path)
+        return f"{len(changed)} of {len(names)} sections changed"
+
+    def fingerprint(self) -> Optional[str]:
+        # Comparing section hashes in _run is as cheap as the ledger and notices edits of the target
+        return None
 
     def to_dict(self) -> str:
         return f"Update: {self.target} with {self.source}"
 
     def run(self) -> None:
-        log_step(f"{self}", True)(self._run)(self.source, self.target)
+        log_step(f"{self}", Context.state.run_step)(self._run)(
+            self.source, self.target, self.sections, self.markers)
+
+
+class FetchStep(Step):
+
+    dict_keys = [("url", str), ("target", str)]
+
+    templates = ["_url", "_target"]
+
+    def __init__(self, url: str, target: str, sha256: Optional[str] = None) -> None:
+        self._url = url
+        self._target = target
+        self.sha256 = sha256.lower() if sha256 is not None else None
+        self.check()
+
+    @property
+    def url(self) -> str:
+        return sub(self._url)
+
+    @property
+    def target(self) -> str:
+        return sub(self._target)
+
+    @classmethod
+    def _from_dict(cls, context: Dict[str, Any], path: List[str]) -> "FetchStep":
+        sha256 = context.get("sha256")
+        if sha256 is not None and not (isinstance(sha256, str) and len(sha256) == 64
+                                       and all(c in "0123456789abcdefABCDEF" for c in sha256)):
+            report_error(
+                f"Invalid value {sha256} for key sha256, expected 64 hex digits", path, context)
+            sha256 = None
+        return cls(context["url"], context["target"], sha256)
+
+    def prefetch(self) -> None:
+        # The downloader pulls in http.client, so it is imported by fetch steps only
+        from setitup.utils.fetch import Downloader
+        Downloader.submit(self.url, self.sha256)
+
+    @staticmethod
+    def _run(url: str, target: str, sha256: Optional[str]) -> None:
+        from setitup.utils.fetch import Downloader
+        cached = Downloader.fetch(url, sha256)
+        target_path = resolve_path(target)
+        # Cached files are named by their hash
+        if target_path.is_file() and target_path.stat().st_size == cached.stat().st_size \
+                and hash_file(target_path) == cached.name:
+            return
+        copy_atomic(cached, target_path)
+
+    def fingerprint(self) -> Optional[str]:
+        # Unpinned URLs may change, they are revalidated on every run
+        if self.sha256 is None:
+            return None
+        return self._fingerprint(self.url, self.target, self.sha256, hash_file(resolve_path(self.target)))
+
+    def to_dict(self) -> str:
+        if self.sha256 is not None:
+            return f"Fetch: {self.url} to {self.target} (sha256: {self.sha256[:12]})"
+        return f"Fetch: {self.url} to {self.target}"
+
+    def run(self) -> None:
+        log_step(f"{self}", Context.state.run_step)(
+            self._run)(self.url, self.target, self.sha256)
+
+    async def run_async(self, limit: "asyncio.Semaphore") -> None:
+        import asyncio
+        async with limit:
+            # Downloads block, so they run on a worker thread with the task's context
+            await asyncio.to_thread(self.run)
+
+
+class GitStep(Step):
+
+    dict_keys = [("url", str), ("target", str)]
+
+    templates = ["_url", "_target"]
+
+    def __init__(self, url: str, target: str, ref: Optional[str] = None, depth: Optional[int] = None) -> None:
+        self._url = url
+        self._target = target
+        self.ref = ref
+        self.depth = depth
+        self.check()
+
+    @property
+    def url(self) -> str:
+        return sub(self._url)
+
+    @property
+    def target(self) -> str:
+        return sub(self._target)
+
+    @classmethod
+    def _from_dict(cls, context: Dict[str, Any], path: List[str]) -> "GitStep":
+        ref = context.get("ref")
+        if ref is not None and not isinstance(ref, str):
+            report_error(f"Invalid value {ref} for key ref", path, context)
+            ref = None
+        depth = context.get("depth")
+        if depth is not None and (not isinstance(depth, int) or isinstance(depth, bool) or depth < 1):
+            report_error(
+                f"Invalid value {depth} for key depth, expected a positive integer", path, context)
+            depth = None
+        return cls(context["url"], context["target"], ref, depth)
+
+    def prefetch(self) -> None:
+        from setitup.utils.git import GitMirrors
+        GitMirrors.prefetch(self.url)
+
+    @staticmethod
+    def _run(url: str, target: str, ref: Optional[str], depth: Optional[int]) -> None:
+        from setitup.utils.git import GitMirrors
+        GitMirrors.checkout(url, resolve_path(target), ref, depth)
+
+    def to_dict(self) -> str:
+        options = [f"ref: {self.ref}"] if self.ref is not None else []
+        options += [f"depth: {self.depth}"] if self.depth is not None else []
+        suffix = f" ({', '.join(options)})" if options else ""
+        return f"Git: {self.url} to {self.target}{suffix}"
+
+    def run(self) -> None:
+        log_step(f"{self}", Context.state.run_step)(
+            self._run)(self.url, self.target, self.ref, self.depth)
+
+    async def run_async(self, limit: "asyncio.Semaphore") -> None:
+        import asyncio
+        async with limit:
+            await asyncio.to_thread(self.run)
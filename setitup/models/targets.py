@@ -0,0 +1,96 @@
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from setitup.models.context import ENV, Context
+from setitup.models.dict_objects import (DictObject, ValidationError,
+                                         collect_errors, report_error)
+from setitup.utils.io import read_local_toml
+from setitup.utils.templates import get_template
+from setitup.utils.utils import sub
+
+
+class Target(DictObject):
+    """
+    A home directory or prefix to provision, with variables layered over the environment.
+    Overlay values are substituted in order, so they can refer to HOME and to earlier
+    variables, e.g. PATH = "{env.HOME}/.local/bin:{env.PATH}".
+    """
+
+    dict_keys = [("home", str)]
+
+    def __init__(self, name: str, home: Path, env: Optional[Dict[str, str]] = None) -> None:
+        self.name = name
+        self.home = home
+        self.env = env or {}
+
+    @classmethod
+    def _from_dict(cls, context: Dict[str, Any], path: List[str]) -> "Target":
+        home = Path(context["home"]).expanduser().resolve()
+        if not context["home"] or (home.exists() and not home.is_dir()):
+            report_error(f"Invalid value {context['home']} for key home, expected a directory",
+                         path, context)
+        env = context.get("env", {})
+        if not isinstance(env, dict) or not all(isinstance(v, str) for v in env.values()):
+            report_error(f"Invalid value {env} for key env", path, context)
+            env = {}
+        for i, (key, value) in enumerate(env.items()):
+            later = get_template(value).env_keys & set(list(env)[i + 1:])
+            if later:
+                report_error(f"Variable {key} refers to {', '.join(sorted(later))}, "
+                             "which is set after it", path + ["env", key], context)
+        name = context.get("name", home.name)
+        # Names become log file names
+        if not isinstance(name, str) or name in ("", ".", "..") or \
+                any(sep in name for sep in (os.sep, os.altsep, "/") if sep):
+            report_error(f"Invalid value {name} for key name, expected a file name",
+                         path, context)
+            name = home.name
+        return cls(name, home, env)
+
+    def apply(self) -> None:
+        """
+        Makes the target the home directory and environment of steps run by this process.
+        """
+        env = {**ENV, "HOME": str(self.home)}
+        Context.env = env
+        Context.homr_dir = self.home
+        for key, value in self.env.items():
+            env[key] = sub(value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "home": str(self.home), "env": self.env}
+
+
+def parse_targets(targets_path: Path) -> List[Target]:
+    """
+    Reads targets from a TOML file with one [[targets]] table per home or prefix.
+
+    Args:
+        targets_path (Path): path to the targets file.
+
+    Raises:
+        ValidationError: all errors found in the file.
+
+    Returns:
+        List[Target]: targets in file order.
+    """
+    nodes = read_local_toml(targets_path).get("targets", [])
+    targets: List[Target] = []
+    with collect_errors() as errors:
+        if not isinstance(nodes, list) or not nodes:
+            report_error("Expected a non-empty [[targets]] list",
+                         [], {"targets": nodes})
+            nodes = []
+        for i, node in enumerate(nodes):
+            target = Target.from_dict(node, ["targets", str(i)])
+            if target is None:
+                continue
+            if any(other.name == target.name for other in targets):
+                report_error(
+                    f"Duplicate target name {target.name}, set a unique name", ["targets", str(i)], node)
+            targets.append(target)
+    if errors:
+        raise ValidationError(
+            errors, f"Error reading targets from {targets_path} ({len(errors)} errors)")
+    return targets
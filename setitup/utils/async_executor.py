@@ -0,0 +1,108 @@
+import asyncio
+from time import perf_counter
+from typing import List
+
+from setitup.models.context import Context
+from setitup.models.steps import Step
+from setitup.utils.events import current_package
+from setitup.utils.executor import (Phase, after_step, flush_package,
+                                    get_depends, get_steps, step_fingerprint)
+from setitup.utils.history import History
+from setitup.utils.journal import Journal
+from setitup.utils.ledger import Ledger
+from setitup.utils.logging import (buffered_output, colored, echo,
+                                   log_unchanged)
+from setitup.utils.profile import profile_span
+
+# ---------------------------------------------------------------------------- #
+#                           Asyncio Package Execution                          #
+# ---------------------------------------------------------------------------- #
+
+
+async def run_step_async(step: Step, limit: asyncio.Semaphore, index: int = 0) -> None:
+    """
+    Coroutine version of run_step.
+
+    Args:
+        step (Step): step to run.
+        limit (asyncio.Semaphore): global limit on concurrently running commands.
+        index (int, optional): position of the step in its package. Defaults to 0.
+    """
+    if Journal.done(index, step):
+        log_unchanged(f"{step}")
+        return
+    runs = Context.state.run_step
+    fingerprint = step_fingerprint(step)
+    if fingerprint is not None and Ledger.done(fingerprint):
+        log_unchanged(f"{step}")
+        return
+    # CPU time includes other tasks interleaved on the event loop
+    start = perf_counter()
+    with History.measure(step, index), profile_span(f"{step}", "step"):
+        await step.run_async(limit)
+    duration = perf_counter() - start
+    after_step()
+    if fingerprint is not None:
+        Ledger.record(fingerprint, f"{step}", duration)
+    if runs:
+        Journal.record(index, step)
+
+
+async def run_steps_async(steps: List[Step], limit: asyncio.Semaphore) -> None:
+    """
+    Runs the steps of one package in order inside the current asyncio task.
+
+    Args:
+        steps (List[Step]): steps to run.
+        limit (asyncio.Semaphore): global limit on concurrently running commands.
+    """
+    Context.state.run_step = True
+    for index, step in enumerate(steps):
+        await run_step_async(step, limit, index)
+
+
+async def _run_packages(packages: List[str], phase: Phase, jobs: int) -> List[str]:
+    limit = asyncio.Semaphore(jobs)
+    finished = {pk: asyncio.Event() for pk in packages}
+
+    async def run_package(package: str) -> None:
+        current_package.set(package)
+        lines: List[str] = []
+        try:
+            with buffered_output() as lines:
+                try:
+                    for dep in get_depends(package, packages):
+                        await finished[dep].wait()
+                    await run_steps_async(get_steps(package, phase), limit)
+                except asyncio.CancelledError:
+                    echo(colored("  CANCELLED", color="red"))
+                    raise
+        finally:
+            flush_package(package, lines)
+        finished[package].set()
+
+    tasks = {asyncio.create_task(run_package(pk)): pk for pk in packages}
+    _, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+
+    # Cancel siblings once a package fails
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+
+    return [pk for task, pk in tasks.items() if not task.cancelled() and task.exception() is not None]
+
+
+def run_packages_async(packages: List[str], phase: Phase, jobs: int) -> List[str]:
+    """
+    Runs the packages on an asyncio event loop. At most jobs commands run at once and a
+    failure cancels all other packages.
+
+    Args:
+        packages (List[str]): packages to run, in bundle order.
+        phase (Phase): "install" or "config".
+        jobs (int): limit on concurrently running commands.
+
+    Returns:
+        List[str]: packages that failed.
+    """
+    return asyncio.run(_run_packages(packages, phase, jobs))
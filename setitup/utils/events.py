@@ -0,0 +1,145 @@
+import atexit
+import json
+import threading
+import time
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, List, Literal, Optional
+
+EventKind = Literal[
+    "section_started", "section_ended", "section_failed",
+    "step_started", "step_skipped", "step_unchanged", "step_succeeded", "step_failed",
+    "run_failed",
+]
+
+current_package: ContextVar[Optional[str]] = ContextVar(
+    "current_package", default=None)
+
+# ---------------------------------------------------------------------------- #
+#                                    Events                                    #
+# ---------------------------------------------------------------------------- #
+
+
+class Event:
+    """
+    A state change of a section or step.
+    """
+    __slots__ = ("kind", "name", "time", "package",
+                 "duration", "status", "details", "output")
+
+    def __init__(
+        self,
+        kind: EventKind,
+        name: str,
+        duration: Optional[float] = None,
+        status: Optional[int] = None,
+        details: List[Any] = [],
+        output: Any = None,
+    ) -> None:
+        self.kind = kind
+        self.name = name
+        self.time = time.time()
+        self.package = current_package.get()
+        self.duration = duration
+        self.status = status
+        self.details = details
+        self.output = output
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "name": self.name,
+            "time": self.time,
+            "package": self.package,
+            "duration": self.duration,
+            "status": self.status,
+            "details": [str(detail) for detail in self.details],
+            "output": None if self.output is None else str(self.output),
+        }
+
+
+class Sink:
+    def handle(self, event: Event) -> None:
+        raise NotImplementedError(f"{self.__class__}.handle not implemented")
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.flush()
+
+
+class NullSink(Sink):
+    """
+    Discards all events, e.g. for benchmarks.
+    """
+
+    def handle(self, event: Event) -> None:
+        pass
+
+
+class JsonLinesSink(Sink):
+    """
+    Appends events to a file as JSON lines, in batches.
+    """
+
+    def __init__(self, file_path: Path, buffer_size: int = 256) -> None:
+        self.file_path = file_path
+        self.buffer_size = buffer_size
+        self.buffer: List[str] = []
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def handle(self, event: Event) -> None:
+        line = json.dumps(event.to_dict())
+        with self._lock:
+            self.buffer.append(line)
+            if len(self.buffer) >= self.buffer_size:
+                self._flush()
+
+    def _flush(self) -> None:
+        if not self.buffer:
+            return
+        self.file_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.file_path, "a") as f:
+            f.write("\n".join(self.buffer) + "\n")
+        self.buffer = []
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
+
+
+class EventBus:
+    """
+    Sends events to all registered sinks. The terminal renderer is registered by setitup.utils.logging.
+    """
+
+    sinks: List[Sink] = []
+
+    @classmethod
+    def emit(cls, kind: EventKind, name: str, **fields: Any) -> None:
+        sinks = cls.sinks
+        if not sinks:
+            return
+        event = Event(kind, name, **fields)
+        for sink in sinks:
+            sink.handle(event)
+
+    @classmethod
+    def flush(cls) -> None:
+        """
+        Writes out buffered events, e.g. before forking so that children do not inherit them.
+        """
+        for sink in cls.sinks:
+            sink.flush()
+
+    @classmethod
+    def add_sink(cls, sink: Sink) -> None:
+        cls.sinks = cls.sinks + [sink]
+
+    @classmethod
+    def set_sinks(cls, sinks: List[Sink]) -> None:
+        for sink in cls.sinks:
+            sink.close()
+        cls.sinks = list(sinks)
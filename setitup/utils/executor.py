@@ -0,0 +1,257 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from time import perf_counter
+from typing import Dict, List, Literal, Optional, Set, Tuple
+
+from setitup.components.checks import PathIndex
+from setitup.models.context import Context
+from setitup.models.recipes import Recipes
+from setitup.models.steps import GuardStep, Step
+from setitup.utils.events import current_package
+from setitup.utils.fetch import Downloader
+from setitup.utils.guards import GuardResults
+from setitup.utils.history import History
+from setitup.utils.journal import Journal
+from setitup.utils.ledger import Ledger
+from setitup.utils.logging import (StepError, buffered_output, colored, echo,
+                                   last_words, log_unchanged)
+from setitup.utils.profile import profile_span
+from setitup.utils.rc import rc_transaction
+
+Phase = Literal["install", "config"]
+
+# ---------------------------------------------------------------------------- #
+#                               Package Execution                              #
+# ---------------------------------------------------------------------------- #
+
+
+def get_steps(package: str, phase: Phase) -> List[Step]:
+    """
+    Gets the steps of a package for the given phase.
+
+    Args:
+        package (str): package name.
+        phase (Phase): "install" or "config".
+
+    Returns:
+        List[Step]: steps in recipe order. Empty if the recipe has no such spec.
+    """
+    spec = getattr(Recipes.recipes[package], phase)
+    return spec.steps if spec is not None else []
+
+
+def get_depends(package: str, packages: List[str]) -> List[str]:
+    """
+    Gets the dependencies of a package among the selected packages.
+    Dependencies outside of the selection are assumed to be satisfied.
+    """
+    return [dep for dep in Recipes.recipes[package].depends if dep in packages]
+
+
+def order_packages(packages: List[str]) -> List[List[str]]:
+    """
+    Groups packages into stages. Packages in a stage only depend on packages in earlier stages.
+
+    Args:
+        packages (List[str]): packages in bundle order.
+
+    Returns:
+        List[List[str]]: stages of packages, each in bundle order.
+    """
+    stages: List[List[str]] = []
+    done: Set[str] = set()
+    pending = list(packages)
+    while pending:
+        stage = [pk for pk in pending if all(
+            dep in done for dep in get_depends(pk, packages))]
+        if not stage:
+            last_words(
+                f"Circular dependencies between {', '.join(pending)}.")
+        stages.append(stage)
+        done.update(stage)
+        pending = [pk for pk in pending if pk not in done]
+    return stages
+
+
+def after_step() -> None:
+    # Steps may install into PATH, which changes the answers of guards
+    if PathIndex.refresh():
+        GuardResults.invalidate()
+
+
+def reset_guards() -> None:
+    # The environment may have changed since the last run, e.g. for another target
+    PathIndex.refresh()
+    GuardResults.invalidate()
+
+
+def prefetch_steps(packages: List[str], phase: Phase) -> None:
+    """
+    Starts the downloads of steps that will run, so they overlap with earlier steps.
+    Steps skipped by guards as they evaluate now are not prefetched; if an earlier step
+    makes such a guard true, the step downloads when it runs.
+
+    Args:
+        packages (List[str]): packages to run.
+        phase (Phase): "install" or "config".
+    """
+    for package in packages:
+        Context.state.run_step = True
+        for step in get_steps(package, phase):
+            if isinstance(step, GuardStep):
+                Context.state.run_step = step.run_step
+            elif Context.state.run_step:
+                step.prefetch()
+    Context.state.run_step = True
+
+
+def step_fingerprint(step: Step) -> Optional[str]:
+    # Steps skipped by guards are neither looked up nor recorded
+    return step.fingerprint() if Context.state.run_step else None
+
+
+def run_step(step: Step, index: int = 0) -> None:
+    """
+    Runs a step unless the ledger shows it already succeeded with the same inputs,
+    or the resumed run completed it.
+
+    Args:
+        step (Step): step to run.
+        index (int, optional): position of the step in its package. Defaults to 0.
+    """
+    if Journal.done(index, step):
+        log_unchanged(f"{step}")
+        return
+    runs = Context.state.run_step
+    fingerprint = step_fingerprint(step)
+    if fingerprint is not None and Ledger.done(fingerprint):
+        log_unchanged(f"{step}")
+        return
+    start = perf_counter()
+    with History.measure(step, index), profile_span(f"{step}", "step"):
+        step.run()
+    duration = perf_counter() - start
+    after_step()
+    if fingerprint is not None:
+        Ledger.record(fingerprint, f"{step}", duration)
+    if runs:
+        Journal.record(index, step)
+
+
+def run_steps(steps: List[Step]) -> bool:
+    """
+    Runs the steps of one package in order on the current thread.
+
+    Args:
+        steps (List[Step]): steps to run.
+
+    Returns:
+        bool: whether all steps succeeded.
+    """
+    Context.state.run_step = True
+    try:
+        for index, step in enumerate(steps):
+            run_step(step, index)
+    except StepError:
+        return False
+    return True
+
+
+def flush_package(package: str, lines: List[str]) -> None:
+    echo(colored(f"[{package}]", color="yellow"))
+    for line in lines:
+        echo(line)
+
+
+def _run_package(package: str, phase: Phase, buffered: bool) -> Tuple[bool, List[str]]:
+    current_package.set(package)
+    if not buffered:
+        echo(colored(f"[{package}]", color="yellow"))
+        return run_steps(get_steps(package, phase)), []
+    with buffered_output() as lines:
+        ok = run_steps(get_steps(package, phase))
+    return ok, lines
+
+
+def _run_packages_threaded(packages: List[str], phase: Phase, jobs: int) -> List[str]:
+    buffered = jobs > 1
+    pending = list(packages)
+    done: Set[str] = set()
+    failed: List[str] = []
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        running: Dict[Future[Tuple[bool, List[str]]], str] = {}
+        while pending or running:
+            # Stop scheduling new packages after the first failure
+            if not failed:
+                for package in [pk for pk in pending if all(dep in done for dep in get_depends(pk, packages))]:
+                    pending.remove(package)
+                    running[pool.submit(
+                        _run_package, package, phase, buffered)] = package
+
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                package = running.pop(future)
+                ok, lines = future.result()
+                if buffered:
+                    flush_package(package, lines)
+                if ok:
+                    done.add(package)
+                else:
+                    failed.append(package)
+
+    return failed
+
+
+def run_packages(packages: List[str], phase: Phase, jobs: int = 1, use_asyncio: bool = False, resume: bool = False) -> None:
+    """
+    Runs the install or config steps of packages concurrently.
+    Steps within a package run in order. A package only starts once the packages
+    it depends on have finished. Output is grouped per package.
+
+    With threads, at most jobs packages run at once and no new package starts after a failure.
+    With asyncio, at most jobs commands run at once and a failure cancels all other packages.
+
+    Completed steps are journaled until the run succeeds. With resume, the steps completed by
+    the previous run of the same packages are skipped, so it continues from its failed steps.
+
+    Args:
+        packages (List[str]): packages to run, in bundle order.
+        phase (Phase): "install" or "config".
+        jobs (int, optional): concurrency limit. Defaults to 1.
+        use_asyncio (bool, optional): whether to run on an asyncio event loop. Defaults to False.
+        resume (bool, optional): whether to continue the previous failed run. Defaults to False.
+    """
+    # Fail early on circular dependencies
+    order_packages(packages)
+    reset_guards()
+    History.begin(phase)
+
+    # Downloads run in the background while earlier steps execute
+    prefetch_steps(packages, phase)
+
+    completed = Journal.open(packages, phase, resume)
+    if completed:
+        echo(colored(
+            f"Resuming, {completed} steps completed by the previous run are skipped", color="cyan"))
+
+    # Rc lines of all steps are written once at the end, update steps flush their own file
+    failed = list(packages)
+    try:
+        with rc_transaction():
+            if use_asyncio:
+                # asyncio is only imported when asked for, it dominates cold start
+                from setitup.utils.async_executor import run_packages_async
+                failed = run_packages_async(packages, phase, jobs)
+            else:
+                failed = _run_packages_threaded(packages, phase, jobs)
+    finally:
+        Downloader.shutdown()
+        History.flush()
+        Journal.close(packages, phase, not failed)
+
+    if failed:
+        last_words([f"Failed to {phase} {', '.join(failed)}.",
+                    "Run again with --resume to continue from the failed steps."])
@@ -0,0 +1,426 @@
+import base64
+import hashlib
+import http.client
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+from urllib.parse import SplitResult, unquote, urljoin, urlsplit
+
+from setitup.models.context import Context
+
+FETCH_WORKERS = 8
+FETCH_TIMEOUT = 60
+MAX_REDIRECTS = 5
+CHUNK_BYTES = 1024 * 1024
+
+T = TypeVar("T")
+
+# ---------------------------------------------------------------------------- #
+#                                   Downloads                                  #
+# ---------------------------------------------------------------------------- #
+
+
+class FetchError(Exception):
+    """
+    A download failed or did not match its pinned hash. Carries the HTTP status if there was one.
+    """
+
+    def __init__(self, messages: List[str], status: Optional[int] = None) -> None:
+        super().__init__(messages)
+        self.status = status
+
+
+def get_proxy(scheme: str, netloc: str) -> Optional[SplitResult]:
+    """
+    Finds the proxy for a host from http_proxy, https_proxy and no_proxy in Context.env,
+    upper or lower case, like wget and curl.
+
+    Returns:
+        Optional[SplitResult]: parsed proxy URL, or None to connect directly.
+    """
+    from urllib.request import proxy_bypass_environment
+
+    env = Context.env
+    proxy = env.get(f"{scheme}_proxy") or env.get(f"{scheme.upper()}_PROXY")
+    no_proxy = env.get("no_proxy") or env.get("NO_PROXY") or ""
+    if not proxy or proxy_bypass_environment(netloc, {"no": no_proxy}):
+        return None
+    return urlsplit(proxy if "://" in proxy else f"http://{proxy}")
+
+
+def _proxy_headers(proxy: SplitResult) -> Dict[str, str]:
+    if proxy.username is None:
+        return {}
+    credentials = f"{unquote(proxy.username)}:{unquote(proxy.password or '')}"
+    return {"Proxy-Authorization": f"Basic {base64.b64encode(credentials.encode()).decode()}"}
+
+
+class ConnectionPool:
+    """
+    Idle keep-alive connections by scheme and host, shared by all download threads.
+    Connections go through the proxy of the host, if any: plain HTTP is forwarded and HTTPS
+    is tunneled with CONNECT.
+    """
+
+    _idle: Dict[Tuple[str, str], List[http.client.HTTPConnection]] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, scheme: str, netloc: str) -> Tuple[http.client.HTTPConnection, bool]:
+        """
+        Returns:
+            Tuple[http.client.HTTPConnection, bool]: connection and whether it was reused.
+        """
+        with cls._lock:
+            idle = cls._idle.get((scheme, netloc))
+            if idle:
+                return idle.pop(), True
+        return cls.new(scheme, netloc), False
+
+    @classmethod
+    def new(cls, scheme: str, netloc: str) -> http.client.HTTPConnection:
+        proxy = get_proxy(scheme, netloc)
+        if scheme == "https":
+            import ssl
+            if proxy is None:
+                return http.client.HTTPSConnection(netloc, timeout=FETCH_TIMEOUT,
+                                                   context=ssl.create_default_context())
+            conn = http.client.HTTPSConnection(proxy.netloc.rpartition("@")[2], timeout=FETCH_TIMEOUT,
+                                               context=ssl.create_default_context())
+            conn.set_tunnel(netloc, headers=_proxy_headers(proxy))
+            return conn
+        if scheme == "http":
+            host = netloc if proxy is None else proxy.netloc.rpartition("@")[2]
+            return http.client.HTTPConnection(host, timeout=FETCH_TIMEOUT)
+        raise FetchError([f"Unsupported URL scheme {scheme}"])
+
+    @classmethod
+    def put(cls, scheme: str, netloc: str, conn: http.client.HTTPConnection) -> None:
+        with cls._lock:
+            cls._idle.setdefault((scheme, netloc), []).append(conn)
+
+    @classmethod
+    def close(cls) -> None:
+        with cls._lock:
+            for conns in cls._idle.values():
+                for conn in conns:
+                    conn.close()
+            cls._idle = {}
+
+
+class FetchCache:
+    """
+    Content-addressed store of downloads under Context.cache_dir, with an index of URLs for
+    conditional requests. Least recently used objects are evicted beyond Context.fetch_cache_bytes.
+    """
+
+    _conn: Optional[sqlite3.Connection] = None
+    _lock = threading.Lock()
+    # Objects of unpinned URLs already downloaded or revalidated by this process
+    _fresh: Dict[str, str] = {}
+
+    @classmethod
+    def root(cls) -> Path:
+        return Context.cache_dir / "fetch"
+
+    @classmethod
+    def object_path(cls, sha256: str) -> Path:
+        return cls.root() / "objects" / sha256[:2] / sha256
+
+    @classmethod
+    def _connect(cls) -> sqlite3.Connection:
+        if cls._conn is None:
+            cls.root().mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(cls.root() / "index.sqlite",
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS objects (sha256 TEXT PRIMARY KEY, size INTEGER, last_used REAL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, sha256 TEXT, etag TEXT, last_modified TEXT)")
+            cls._conn = conn
+        return cls._conn
+
+    @classmethod
+    def close(cls) -> None:
+        """
+        Closes the index, e.g. before forking since SQLite connections must not cross processes.
+        """
+        with cls._lock:
+            if cls._conn is not None:
+                cls._conn.close()
+            cls._conn = None
+
+    @classmethod
+    def lookup(cls, sha256: str) -> Optional[Path]:
+        """
+        Gets a cached object and marks it as used.
+        """
+        path = cls.object_path(sha256)
+        with cls._lock:
+            conn = cls._connect()
+            if not path.is_file():
+                conn.execute(
+                    "DELETE FROM objects WHERE sha256 = ?", (sha256,))
+                conn.commit()
+                return None
+            conn.execute("INSERT OR REPLACE INTO objects VALUES (?, ?, ?)",
+                         (sha256, path.stat().st_size, time.time()))
+            conn.commit()
+        return path
+
+    @classmethod
+    def validators(cls, url: str) -> Tuple[Optional[str], Dict[str, str]]:
+        """
+        Gets the object last downloaded from a URL and the headers to revalidate it.
+
+        Returns:
+            Tuple[Optional[str], Dict[str, str]]: sha256 of the cached object, if any, and request headers.
+        """
+        with cls._lock:
+            row = cls._connect().execute(
+                "SELECT sha256, etag, last_modified FROM urls WHERE url = ?", (url,)).fetchone()
+        if row is None or not cls.object_path(row[0]).is_file():
+            return None, {}
+        headers: Dict[str, str] = {}
+        if row[1]:
+            headers["If-None-Match"] = row[1]
+        if row[2]:
+            headers["If-Modified-Since"] = row[2]
+        return row[0], headers
+
+    @classmethod
+    def add(cls, tmp_path: Path, sha256: str, url: str, etag: Optional[str], last_modified: Optional[str]) -> Path:
+        """
+        Moves a finished download into the store, records its URL and evicts old objects.
+        """
+        path = cls.object_path(sha256)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_path, path)
+        with cls._lock:
+            conn = cls._connect()
+            conn.execute("INSERT OR REPLACE INTO objects VALUES (?, ?, ?)",
+                         (sha256, path.stat().st_size, time.time()))
+            conn.execute("INSERT OR REPLACE INTO urls VALUES (?, ?, ?, ?)",
+                         (url, sha256, etag, last_modified))
+            cls._evict(conn, keep=sha256)
+            conn.commit()
+        return path
+
+    @classmethod
+    def _evict(cls, conn: sqlite3.Connection, keep: str) -> None:
+        total = conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM objects").fetchone()[0]
+        if total <= Context.fetch_cache_bytes:
+            return
+        for sha256, size in conn.execute(
+                "SELECT sha256, size FROM objects ORDER BY last_used").fetchall():
+            if total <= Context.fetch_cache_bytes:
+                break
+            if sha256 == keep:
+                continue
+            cls.object_path(sha256).unlink(missing_ok=True)
+            conn.execute("DELETE FROM objects WHERE sha256 = ?", (sha256,))
+            total -= size
+
+
+def _request(scheme: str, netloc: str, target: str, headers: Dict[str, str]) -> Tuple[http.client.HTTPConnection, http.client.HTTPResponse]:
+    conn, reused = ConnectionPool.get(scheme, netloc)
+    headers = {"User-Agent": "setitup",
+               "Accept-Encoding": "identity", **headers}
+    proxy = get_proxy(scheme, netloc) if scheme == "http" else None
+    if proxy is not None:
+        # Forwarding proxies take the absolute URL
+        target = f"http://{netloc}{target}"
+        headers.update(_proxy_headers(proxy))
+    try:
+        conn.request("GET", target, headers=headers)
+        return conn, conn.getresponse()
+    except (http.client.RemoteDisconnected, ConnectionError):
+        conn.close()
+        if not reused:
+            raise
+    # The server closed the idle connection, retry once on a new one
+    conn = ConnectionPool.new(scheme, netloc)
+    conn.request("GET", target, headers=headers)
+    return conn, conn.getresponse()
+
+
+def _store(response: http.client.HTTPResponse, url: str, sha256: Optional[str]) -> Path:
+    """
+    Streams a response into a temporary file in the cache while hashing it.
+    """
+    tmp_dir = FetchCache.root() / "tmp"
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        digest = hashlib.sha256()
+        with os.fdopen(fd, "wb") as f:
+            while chunk := response.read(CHUNK_BYTES):
+                digest.update(chunk)
+                f.write(chunk)
+        actual = digest.hexdigest()
+        if sha256 is not None and actual != sha256.lower():
+            raise FetchError(
+                [f"Hash mismatch for {url}", f"expected {sha256}", f"got {actual}"])
+        return FetchCache.add(Path(tmp_name), actual, url,
+                              response.getheader("ETag"), response.getheader("Last-Modified"))
+    finally:
+        Path(tmp_name).unlink(missing_ok=True)
+
+
+def download(url: str, sha256: Optional[str] = None) -> Path:
+    """
+    Downloads a URL into the cache, following redirects. Pinned downloads already in the cache
+    never touch the network. Unpinned URLs are revalidated with the ETag or Last-Modified of
+    their last download.
+
+    Args:
+        url (str): http or https URL.
+        sha256 (Optional[str], optional): expected hash of the content. Defaults to None.
+
+    Raises:
+        FetchError: on HTTP errors or a hash mismatch.
+
+    Returns:
+        Path: cached file. Must not be modified.
+    """
+    if sha256 is not None:
+        path = FetchCache.lookup(sha256.lower())
+        if path is not None:
+            return path
+
+    if sha256 is None and url in FetchCache._fresh:
+        path = FetchCache.lookup(FetchCache._fresh[url])
+        if path is not None:
+            return path
+
+    cached, headers = (None, {}) if sha256 else FetchCache.validators(url)
+    current = url
+    for _ in range(MAX_REDIRECTS + 1):
+        parts = urlsplit(current)
+        if parts.scheme not in ("http", "https"):
+            raise FetchError([f"Unsupported URL {current}"])
+        target = parts.path or "/"
+        if parts.query:
+            target += f"?{parts.query}"
+
+        conn, response = _request(parts.scheme, parts.netloc, target, headers)
+        try:
+            if response.status in (301, 302, 303, 307, 308):
+                response.read()
+                location = response.getheader("Location")
+                if location is None:
+                    raise FetchError(
+                        [f"Redirect without location from {current}"], response.status)
+                current = urljoin(current, location)
+                continue
+            if response.status == 304 and cached is not None:
+                response.read()
+                path = FetchCache.lookup(cached)
+                if path is None:
+                    raise FetchError([f"Cached download of {url} vanished"])
+                FetchCache._fresh[url] = cached
+                return path
+            if response.status != 200:
+                response.read()
+                raise FetchError(
+                    [f"GET {current} returned {response.status} {response.reason}"], response.status)
+            path = _store(response, url, sha256)
+            FetchCache._fresh[url] = path.name
+            return path
+        finally:
+            # Keep the connection only if the response was read to the end
+            if response.will_close or not response.isclosed():
+                conn.close()
+            else:
+                ConnectionPool.put(parts.scheme, parts.netloc, conn)
+
+    raise FetchError([f"Too many redirects from {url}"])
+
+
+class Downloader:
+    """
+    Runs downloads on a shared thread pool. Steps can be prefetched before they run, and
+    concurrent requests for the same key share one task.
+    """
+
+    _pool: Optional[ThreadPoolExecutor] = None
+    _futures: Dict[Tuple[str, ...], "Future[Any]"] = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _failed(future: "Future[Any]") -> bool:
+        return future.done() and (future.cancelled() or future.exception() is not None)
+
+    @classmethod
+    def run(cls, key: Tuple[str, ...], f: Callable[..., T], *args: Any) -> "Future[T]":
+        """
+        Starts a network task once per key and run, e.g. a download or a git fetch.
+        Failed tasks are not kept, so the next call for the key starts a fresh attempt.
+        """
+        with cls._lock:
+            future = cls._futures.get(key)
+            if future is None or cls._failed(future):
+                if cls._pool is None:
+                    cls._pool = ThreadPoolExecutor(
+                        max_workers=FETCH_WORKERS, thread_name_prefix="fetch")
+                future = cls._futures[key] = cls._pool.submit(f, *args)
+        return future
+
+    @classmethod
+    def result(cls, key: Tuple[str, ...], f: Callable[..., T], *args: Any) -> T:
+        """
+        Waits for a network task, starting it if needed. If a task started earlier, e.g. by a
+        prefetch, fails, it is retried once, so the caller always makes its own attempt.
+        """
+        with cls._lock:
+            future = cls._futures.get(key)
+            started_earlier = future is not None and not cls._failed(future)
+        try:
+            return cls.run(key, f, *args).result()
+        except Exception:
+            if not started_earlier:
+                raise
+        return cls.run(key, f, *args).result()
+
+    @classmethod
+    def submit(cls, url: str, sha256: Optional[str] = None) -> "Future[Path]":
+        return cls.run(("url", url, sha256 or ""), download, url, sha256)
+
+    @classmethod
+    def fetch(cls, url: str, sha256: Optional[str] = None) -> Path:
+        """
+        Waits for the download of a URL, starting it if it was not prefetched.
+        """
+        return cls.result(("url", url, sha256 or ""), download, url, sha256)
+
+    @classmethod
+    def shutdown(cls) -> None:
+        """
+        Cancels prefetches that have not started and forgets finished downloads.
+        """
+        with cls._lock:
+            if cls._pool is not None:
+                cls._pool.shutdown(wait=False, cancel_futures=True)
+            cls._pool = None
+            cls._futures = {}
+        ConnectionPool.close()
+        FetchCache.close()
+
+    @classmethod
+    def drain(cls) -> None:
+        """
+        Waits for all started tasks, then shuts down. Failures are not kept, the steps that
+        need the results start them again.
+        """
+        with cls._lock:
+            pool = cls._pool
+        if pool is not None:
+            pool.shutdown(wait=True)
+        cls.shutdown()
@@ -0,0 +1,136 @@
+import fcntl
+import hashlib
+import re
+from contextlib import contextmanager
+from pathlib import Path
+from shlex import quote
+from shutil import rmtree
+from typing import Iterator, Optional, Set
+
+from setitup.models.context import Context
+from setitup.utils.fetch import Downloader
+from setitup.utils.process import CommandError, run_command
+
+# Never wait for credentials on a terminal nobody is watching
+GIT = "GIT_TERMINAL_PROMPT=0 git"
+
+# ---------------------------------------------------------------------------- #
+#                                  Git Mirrors                                 #
+# ---------------------------------------------------------------------------- #
+
+
+def git(args: str, cwd: Optional[Path] = None) -> str:
+    """
+    Runs a git command.
+
+    Raises:
+        CommandError: when git fails.
+
+    Returns:
+        str: last lines of output.
+    """
+    cmd = f"{GIT} -C {quote(str(cwd))} {args}" if cwd is not None else f"{GIT} {args}"
+    result = run_command(cmd, stream=Context.verbose)
+    if not result.ok:
+        raise CommandError([f"{cmd} exited with status {result.status}:"] + result.tail,
+                           result.status)
+    return "\n".join(result.tail)
+
+
+class GitMirrors:
+    """
+    Bare mirrors of remote repositories under Context.cache_dir, shared by all targets and runs.
+    The first use clones the mirror, later runs fetch only what changed.
+    """
+
+    # Mirrors already fetched by this process, inherited by forked target workers
+    _fresh: Set[str] = set()
+
+    @classmethod
+    def mirror_path(cls, url: str) -> Path:
+        name = re.sub(r"[^A-Za-z0-9._-]", "_",
+                      url.rstrip("/").rsplit("/", 1)[-1])
+        digest = hashlib.sha256(url.encode()).hexdigest()[:16]
+        return Context.cache_dir / "git" / f"{digest}-{name}"
+
+    @classmethod
+    @contextmanager
+    def _locked(cls, mirror: Path) -> Iterator[None]:
+        # Exclusive across threads and processes, e.g. several targets provisioned at once
+        mirror.parent.mkdir(parents=True, exist_ok=True)
+        with open(f"{mirror}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    @classmethod
+    def _update(cls, url: str) -> Path:
+        mirror = cls.mirror_path(url)
+        with cls._locked(mirror):
+            if (mirror / "HEAD").is_file():
+                if url not in cls._fresh:
+                    git("fetch --quiet --prune --tags origin", mirror)
+            else:
+                # Leftover of an interrupted clone
+                tmp = mirror.with_name(f"{mirror.name}.tmp")
+                if tmp.exists():
+                    rmtree(tmp)
+                git(f"clone --quiet --mirror {quote(url)} {quote(str(tmp))}")
+                tmp.rename(mirror)
+        cls._fresh.add(url)
+        return mirror
+
+    @classmethod
+    def update(cls, url: str) -> Path:
+        """
+        Creates or fetches the mirror of a repository, at most once per process.
+
+        Args:
+            url (str): remote URL or path to a repository.
+
+        Returns:
+            Path: path to the bare mirror.
+        """
+        return Downloader.result(("git", url), cls._update, url)
+
+    @classmethod
+    def prefetch(cls, url: str) -> None:
+        Downloader.run(("git", url), cls._update, url)
+
+    @classmethod
+    def checkout(cls, url: str, target: Path, ref: Optional[str] = None, depth: Optional[int] = None) -> None:
+        """
+        Clones a repository from its mirror, or fast-forwards an existing clone. Objects are
+        hardlinked from the mirror, or copied up to depth commits for shallow clones, so the
+        clone does not depend on the cache afterwards. The origin remote points to url.
+
+        Args:
+            url (str): remote URL or path to a repository.
+            target (Path): working tree to create or update.
+            ref (Optional[str], optional): branch, tag or commit. Defaults to the default branch.
+            depth (Optional[int], optional): number of commits to fetch. Defaults to full history.
+        """
+        mirror = cls.update(url)
+        source = f"file://{mirror}" if depth is not None else str(mirror)
+        shallow = f"--depth {depth} " if depth is not None else ""
+        rev = quote(ref) if ref is not None else "HEAD"
+
+        if (target / ".git").exists():
+            # Without --depth the fetch stops at commits the clone has, shallow or not,
+            # so the result fast-forwards
+            git(f"fetch --quiet {quote(source)} {rev}", target)
+            git("merge --quiet --ff-only FETCH_HEAD", target)
+            return
+        if target.exists() and any(target.iterdir()):
+            raise CommandError(
+                [f"{target} exists and is not a git repository"], 1)
+
+        git(f"clone --quiet --no-checkout {shallow}{quote(source)} {quote(str(target))}")
+        git(f"remote set-url origin {quote(url)}", target)
+        if ref is not None and depth is not None:
+            # Shallow clones only have the default branch, fetch the requested ref as well
+            git(f"fetch --quiet {shallow}{quote(source)} {rev}", target)
+            rev = "FETCH_HEAD"
+        git(f"checkout --quiet {rev}", target)
@@ -0,0 +1,112 @@
+import ast
+import threading
+from functools import lru_cache
+from os.path import exists
+from types import CodeType
+from typing import Any, Callable, Dict
+
+from setitup.components.checks import all_installed, is_installed
+
+# ---------------------------------------------------------------------------- #
+#                               Guard Evaluation                               #
+# ---------------------------------------------------------------------------- #
+
+GUARD_FUNCTIONS: Dict[str, Callable[..., Any]] = {
+    "is_installed": is_installed,
+    "all_installed": all_installed,
+    "exists": exists,
+}
+
+GUARD_NAMES = {"True", "False", "None", *GUARD_FUNCTIONS}
+
+# Functions whose results only change with PATH, which after_step watches. Other functions,
+# e.g. exists, can be made true by any step and are evaluated every time.
+PATH_FUNCTIONS = {"is_installed", "all_installed"}
+
+GUARD_NODES = (
+    ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub, ast.UAdd,
+    ast.Compare, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.In, ast.NotIn,
+    ast.Is, ast.IsNot, ast.Constant, ast.Name, ast.Load, ast.Call, ast.List, ast.Tuple,
+)
+
+
+@lru_cache(maxsize=None)
+def compile_guard(expr: str) -> CodeType:
+    """
+    Compiles a substituted guard expression once. Only literals, comparisons, boolean
+    operators and calls to GUARD_FUNCTIONS are allowed.
+
+    Args:
+        expr (str): guard expression after substitution.
+
+    Raises:
+        ValueError: when the expression is invalid or uses anything else.
+
+    Returns:
+        CodeType: compiled expression.
+    """
+    try:
+        tree = ast.parse(expr.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ValueError([f"Invalid guard {expr}", str(e)]) from e
+
+    for node in ast.walk(tree):
+        if not isinstance(node, GUARD_NODES):
+            raise ValueError(
+                [f"Invalid guard {expr}", f"{type(node).__name__} is not allowed"])
+        if isinstance(node, ast.Name) and node.id not in GUARD_NAMES:
+            raise ValueError(
+                [f"Invalid guard {expr}", f"Unknown name {node.id}"])
+        if isinstance(node, ast.Call) and (not isinstance(node.func, ast.Name) or node.keywords):
+            raise ValueError(
+                [f"Invalid guard {expr}", "Only positional calls to guard functions are allowed"])
+
+    return compile(tree, "<guard>", "eval")
+
+
+@lru_cache(maxsize=None)
+def depends_on_path_only(expr: str) -> bool:
+    """
+    Whether a valid guard expression only calls PATH_FUNCTIONS, so its result can be memoized.
+    """
+    names = {node.id for node in ast.walk(ast.parse(expr.strip(), mode="eval"))
+             if isinstance(node, ast.Name)}
+    return names <= PATH_FUNCTIONS | {"True", "False", "None"}
+
+
+class GuardResults:
+    """
+    Results of guard expressions that only depend on PATH, memoized until PATH changes.
+    """
+
+    _results: Dict[str, bool] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def invalidate(cls) -> None:
+        """
+        Forgets all results, e.g. at the start of a run or when PATH changes.
+        """
+        with cls._lock:
+            cls._results = {}
+
+    @classmethod
+    def evaluate(cls, expr: str) -> bool:
+        """
+        Evaluates a substituted guard expression. Expressions that only depend on PATH are
+        evaluated at most once until the next invalidate.
+
+        Args:
+            expr (str): guard expression after substitution.
+
+        Returns:
+            bool: truthiness of the expression.
+        """
+        results = cls._results
+        if expr in results:
+            return results[expr]
+        result = bool(eval(compile_guard(expr), {"__builtins__": {}}, dict(GUARD_FUNCTIONS)))
+        if depends_on_path_only(expr):
+            with cls._lock:
+                cls._results[expr] = result
+        return result
@@ -0,0 +1,204 @@
+import math
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from setitup.models.context import Context
+from setitup.models.steps import Step
+from setitup.utils.events import current_package
+from setitup.utils.process import OutputMeter
+
+# ---------------------------------------------------------------------------- #
+#                                  Run History                                 #
+# ---------------------------------------------------------------------------- #
+
+HISTORY_COLUMNS = ("run_id", "started_at", "host", "phase", "package", "step_index", "name",
+                   "command_hash", "duration", "status", "output_size")
+
+
+def percentile(values: List[float], q: float) -> float:
+    """
+    Nearest-rank percentile of sorted values.
+    """
+    return values[max(0, math.ceil(q * len(values)) - 1)]
+
+
+class History:
+    """
+    Records every executed step with its duration, exit status and output size, to find the
+    recipes worth optimizing or caching. Stored as SQLite under Context.state_dir.
+    Records are kept in memory during a run and written in one transaction by flush.
+    """
+
+    _conn: Optional[sqlite3.Connection] = None
+    _lock = threading.Lock()
+    _pending: List[Tuple[Any, ...]] = []
+    run_id: str = ""
+    phase: str = ""
+
+    @classmethod
+    def path(cls) -> Path:
+        return Context.state_dir / "history.sqlite"
+
+    @classmethod
+    def _connect(cls) -> sqlite3.Connection:
+        if cls._conn is None:
+            cls.path().parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(cls.path(), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS steps (run_id TEXT, started_at REAL, host TEXT, phase TEXT, "
+                "package TEXT, step_index INTEGER, name TEXT, command_hash TEXT, duration REAL, "
+                "status INTEGER, output_size INTEGER)")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS steps_started_at ON steps (started_at)")
+            cls._conn = conn
+        return cls._conn
+
+    @classmethod
+    def begin(cls, phase: str) -> None:
+        """
+        Starts a new run. Steps recorded until the next call share its run id.
+        """
+        cls.run_id = uuid.uuid4().hex
+        cls.phase = phase
+
+    @classmethod
+    @contextmanager
+    def measure(cls, step: Step, index: int) -> Iterator[None]:
+        """
+        Records a step run inside the block. Steps skipped by guards are not recorded.
+        A failure is recorded with the status of the error that caused it, or 1.
+
+        Args:
+            step (Step): step about to run.
+            index (int): position of the step in its package.
+        """
+        if not Context.state.run_step:
+            yield
+            return
+        started_at = time.time()
+        start = time.perf_counter()
+        # Cancelled or interrupted steps are neither a success nor a failure, and not recorded
+        with OutputMeter.measure() as meter:
+            try:
+                yield
+            except Exception as e:
+                # log_step raises StepError from the original error
+                status = getattr(e.__cause__ or e, "status", None) or 1
+                cls._record(step, index, started_at,
+                            time.perf_counter() - start, status, meter.size)
+                raise
+        cls._record(step, index, started_at,
+                    time.perf_counter() - start, 0, meter.size)
+
+    @classmethod
+    def _record(cls, step: Step, index: int, started_at: float, duration: float, status: int, output_size: int) -> None:
+        # Steps are matched across runs by their unsubstituted recipe entry, not their name
+        record = (cls.run_id, started_at, socket.gethostname(), cls.phase, current_package.get(),
+                  index, f"{step}", step.identity(), duration, status, output_size)
+        with cls._lock:
+            cls._pending.append(record)
+
+    @classmethod
+    def flush(cls) -> None:
+        """
+        Writes the steps recorded since the last flush.
+        """
+        with cls._lock:
+            if not cls._pending:
+                return
+            conn = cls._connect()
+            with conn:
+                conn.executemany(
+                    f"INSERT INTO steps VALUES ({', '.join('?' * len(HISTORY_COLUMNS))})", cls._pending)
+            cls._pending = []
+
+    @classmethod
+    def estimates(cls, packages: List[str], phase: str) -> Dict[Tuple[str, int, str], float]:
+        """
+        Expected durations of steps, the p50 of their successful runs.
+
+        Args:
+            packages (List[str]): packages to estimate.
+            phase (str): "install" or "config".
+
+        Returns:
+            Dict[Tuple[str, int, str], float]: p50 by package, step index and step identity.
+        """
+        if not packages or not cls.path().is_file():
+            return {}
+        query = ("SELECT package, step_index, command_hash, duration FROM steps "
+                 f"WHERE status = 0 AND phase = ? AND package IN ({', '.join('?' * len(packages))})")
+        with cls._lock:
+            rows = cls._connect().execute(query, [phase, *packages]).fetchall()
+
+        samples: Dict[Tuple[str, int, str], List[float]] = {}
+        for package, index, identity, duration in rows:
+            samples.setdefault((package, index, identity), []).append(duration)
+        return {key: percentile(sorted(durations), 0.5) for key, durations in samples.items()}
+
+    @classmethod
+    def stats(cls, since: float, packages: List[str] = [], top: int = 5) -> Dict[str, Any]:
+        """
+        Summarizes the steps recorded after a point in time.
+
+        Args:
+            since (float): UNIX time of the start of the window.
+            packages (List[str], optional): packages to report. Defaults to all.
+            top (int, optional): number of slowest steps per package. Defaults to 5.
+
+        Returns:
+            Dict[str, Any]: per package, p50 and p95 of run durations, failure rate and the
+            slowest steps by p95, slowest packages first.
+        """
+        query = ("SELECT run_id, package, step_index, name, command_hash, duration, status FROM steps "
+                 "WHERE started_at >= ?")
+        args: List[Any] = [since]
+        if packages:
+            query += f" AND package IN ({', '.join('?' * len(packages))})"
+            args += packages
+        query += " ORDER BY started_at"
+        with cls._lock:
+            rows = cls._connect().execute(query, args).fetchall()
+
+        runs: Dict[str, Dict[str, Tuple[float, bool]]] = {}
+        steps: Dict[str, Dict[Tuple[int, str], List[Tuple[float, int]]]] = {}
+        # Names may hold per-run values, steps are grouped by identity under their latest name
+        names: Dict[Tuple[str, int, str], str] = {}
+        for run_id, package, index, name, identity, duration, status in rows:
+            total, failed = runs.setdefault(package, {}).get(run_id, (0.0, False))
+            runs[package][run_id] = (total + duration, failed or status != 0)
+            steps.setdefault(package, {}).setdefault(
+                (index, identity), []).append((duration, status))
+            names[(package, index, identity)] = name
+
+        report: Dict[str, Any] = {}
+        for package, package_runs in runs.items():
+            durations = sorted(total for total, _ in package_runs.values())
+            step_stats = []
+            for (index, identity), samples in steps[package].items():
+                step_durations = sorted(duration for duration, _ in samples)
+                step_stats.append({
+                    "index": index,
+                    "step": names[(package, index, identity)],
+                    "runs": len(samples),
+                    "failure_rate": sum(status != 0 for _, status in samples) / len(samples),
+                    "p50": percentile(step_durations, 0.5),
+                    "p95": percentile(step_durations, 0.95),
+                })
+            step_stats.sort(key=lambda step: -step["p95"])
+            report[package] = {
+                "runs": len(package_runs),
+                "failure_rate": sum(failed for _, failed in package_runs.values()) / len(package_runs),
+                "p50": percentile(durations, 0.5),
+                "p95": percentile(durations, 0.95),
+                "total": sum(durations),
+                "slowest_steps": step_stats[:top],
+            }
+        return dict(sorted(report.items(), key=lambda item: -item[1]["total"]))
@@ -1,8 +1,16 @@
+import hashlib
+import os
+import tempfile
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Literal
+from typing import Any, Callable, Dict, Iterable, List, Literal, Optional, Tuple
 
-import toml
-from setitup.utils.utils import merge_dicts, trim_empty
+from setitup.models.context import Context
+from setitup.utils.utils import ListMerge, merge_dicts, trim_empty
+
+HASH_CHUNK_BYTES = 1024 * 1024
+TOML_WORKERS = 8
+COPY_WORKERS = 4
 
 
 def read_local(file_path: Path, strip: Literal["l", "r", "b", None] = "r", max_empty_lines: int = 2) -> List[str]:
@@ -33,17 +41,307 @@ def read_local(file_path: Path, strip: Literal["l", "r", "b", None] = "r", max_e
     return []
 
 
-def read_local_tomls(file_paths: Path | Iterable[Path]) -> Dict[str, Any]:
+def read_local_toml(file_path: Path) -> Dict[str, Any]:
+    """
+    Read a toml file on host computer as a dictionary. Uses tomllib when available.
+
+    Args:
+        file_path (Path): path to toml file.
+
+    Returns:
+        Dict[str, Any]: parsed dictionary.
+    """
+    # Parsers are imported on first use; cached runs never parse toml
+    try:
+        import tomllib
+    except ImportError:  # Python < 3.11
+        tomllib = None
+    try:
+        if tomllib is not None:
+            with open(file_path, "rb") as f:
+                return tomllib.load(f)
+        import toml
+        return dict(toml.load(file_path))
+    except Exception as e:
+        raise ValueError([f"Error parsing {file_path}", str(e)]) from e
+
+
+def read_local_tomls(file_paths: Path | Iterable[Path], lists: ListMerge = "replace",
+                     list_key: Optional[str] = None) -> Dict[str, Any]:
     """
     Read one or more toml files on host computer as dictionaries.
 
     Args:
-        file_paths (Path): paths to toml files.
+        file_paths (Path): paths to toml files, merged in this order.
+        lists (ListMerge, optional): how lists from different files are merged. Defaults to "replace".
+        list_key (Optional[str], optional): key identifying tables when lists is "key". Defaults to None.
 
     Returns:
         Dict[str, Any]: combined dictionary.
     """
     if isinstance(file_paths, Path):
         file_paths = [file_paths]
-    return merge_dicts([dict(toml.load(file_path))
-                        for file_path in file_paths if file_path.exists()])
+    file_paths = [file_path for file_path in file_paths if file_path.exists()]
+
+    # Files are parsed concurrently but merged in the given order
+    if len(file_paths) > 1:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=min(TOML_WORKERS, len(file_paths))) as pool:
+            dicts = list(pool.map(read_local_toml, file_paths))
+    else:
+        dicts = [read_local_toml(file_path) for file_path in file_paths]
+
+    return merge_dicts(dicts, [str(file_path) for file_path in file_paths], lists, list_key)
+
+
+def resolve_path(path: str) -> Path:
+    """
+    Resolves a path from a recipe. Relative paths are relative to the input directory.
+
+    Args:
+        path (str): path after substitution.
+
+    Returns:
+        Path: resolved path.
+    """
+    # ~ is the home directory being provisioned, which may not be the user's
+    if path == "~" or path.startswith("~/"):
+        resolved = Context.homr_dir / path[2:]
+    else:
+        resolved = Path(path).expanduser()
+    if not resolved.is_absolute():
+        resolved = Path(Context.base_directory) / resolved
+    return resolved
+
+
+def hash_file(file_path: Path) -> str:
+    """
+    Computes the sha256 digest of a file without reading it into memory at once.
+
+    Args:
+        file_path (Path): path to file.
+
+    Returns:
+        str: hex digest, or "missing" if the file does not exist.
+    """
+    if not file_path.is_file():
+        return "missing"
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_BYTES):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _replace_atomic(file_path: Path, fill: Callable[[int], None], mode: Optional[int] = None) -> None:
+    """
+    Fills a temporary file next to file_path, then fsyncs and renames it over file_path.
+    The mode of an existing file is kept, new files get mode if given.
+    """
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(
+        dir=file_path.parent, prefix=f".{file_path.name}.")
+    try:
+        try:
+            fill(fd)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        if file_path.exists():
+            os.chmod(tmp_name, file_path.stat().st_mode & 0o7777)
+        elif mode is not None:
+            os.chmod(tmp_name, mode)
+        os.replace(tmp_name, file_path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+    # Persist the rename itself
+    dir_fd = os.open(file_path.parent, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def write_atomic(file_path: Path, data: bytes) -> bool:
+    """
+    Writes a file through a temporary file, fsync and rename, so readers never see a partial file.
+    Symlinks are followed and the mode of an existing file is kept. Nothing is written if the
+    file already holds the same bytes.
+
+    Args:
+        file_path (Path): path to file.
+        data (bytes): new content.
+
+    Returns:
+        bool: whether the file was written.
+    """
+    file_path = file_path.resolve()
+    if file_path.is_file() and file_path.stat().st_size == len(data) and file_path.read_bytes() == data:
+        return False
+
+    def fill(fd: int) -> None:
+        with memoryview(data) as view:
+            while view:
+                view = view[os.write(fd, view):]
+
+    _replace_atomic(file_path, fill)
+    return True
+
+
+# Linux ioctl that shares the extents of one file with another (btrfs, xfs, overlayfs on them)
+FICLONE = 0x40049409
+
+DIGEST_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=DIGEST_CACHE_SIZE)
+def _digest(path: str, size: int, mtime_ns: int, inode: int) -> str:
+    return hash_file(Path(path))
+
+
+def file_digest(file_path: Path) -> str:
+    """
+    Like hash_file, but remembers the digests of recently hashed files until their size, mtime
+    or inode changes. Sources copied to many targets are hashed once.
+
+    Args:
+        file_path (Path): path to an existing file.
+
+    Returns:
+        str: hex digest.
+    """
+    stat = file_path.stat()
+    return _digest(str(file_path), stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+
+def files_identical(source: Path, target: Path) -> bool:
+    """
+    Compares two files by size, then by streaming hash.
+    """
+    if not target.is_file():
+        return False
+    if source.stat().st_size != target.stat().st_size:
+        return False
+    return file_digest(source) == file_digest(target)
+
+
+def _copy_fd(src_fd: int, dst_fd: int, size: int) -> None:
+    """
+    Copies without passing the data through Python: reflink first, then copy_file_range,
+    then sendfile. Each falls back to the next when the filesystem does not support it.
+    """
+    try:
+        import fcntl
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+        return
+    except OSError:
+        pass
+
+    copied = 0
+    try:
+        while copied < size:
+            n = os.copy_file_range(src_fd, dst_fd, size - copied)
+            if n == 0:
+                break
+            copied += n
+        return
+    except OSError:
+        pass
+
+    while copied < size:
+        n = os.sendfile(dst_fd, src_fd, copied, size - copied)
+        if n == 0:
+            break
+        copied += n
+
+
+def copy_atomic(source: Path, target: Path) -> None:
+    """
+    Copies a file through a temporary file, fsync and rename. Symlinks at target are followed.
+    New targets get the mode of source, existing targets keep theirs.
+
+    Args:
+        source (Path): file to copy.
+        target (Path): destination path.
+    """
+    target = target.resolve()
+
+    def fill(fd: int) -> None:
+        with open(source, "rb") as src:
+            _copy_fd(src.fileno(), fd, os.fstat(src.fileno()).st_size)
+
+    _replace_atomic(target, fill, None if target.exists()
+                    else source.stat().st_mode & 0o7777)
+
+
+def _overwrite_link(source: Path, target: Path) -> bool:
+    """
+    Copies the symlink source as a symlink. A file or symlink at target is replaced,
+    a directory is not.
+    """
+    link = os.readlink(source)
+    if target.is_symlink():
+        if os.readlink(target) == link:
+            return False
+    elif target.is_dir():
+        raise IsADirectoryError(
+            f"Cannot replace directory {target} with the symlink {source}")
+    tmp = target.with_name(f".{target.name}.link")
+    tmp.unlink(missing_ok=True)
+    try:
+        os.symlink(link, tmp)
+        os.replace(tmp, target)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return True
+
+
+def _overwrite_file(source: Path, target: Path) -> bool:
+    if source.is_symlink():
+        return _overwrite_link(source, target)
+    if files_identical(source, target):
+        return False
+    copy_atomic(source, target)
+    return True
+
+
+def overwrite(source: Path, target: Path) -> Tuple[int, int]:
+    """
+    Makes target a copy of source, a file or a directory tree. Files that are already
+    identical are not written, symlinks are copied as symlinks and nothing is deleted.
+    Trees are copied on a small thread pool.
+
+    Args:
+        source (Path): file or directory to copy.
+        target (Path): destination path.
+
+    Raises:
+        FileNotFoundError: when source does not exist.
+
+    Returns:
+        Tuple[int, int]: number of files written and number of files in source.
+    """
+    if not source.exists() and not source.is_symlink():
+        raise FileNotFoundError(f"Missing source {source}")
+    if not source.is_dir() or source.is_symlink():
+        return int(_overwrite_file(source, target)), 1
+
+    pairs: List[Tuple[Path, Path]] = []
+    for root, dirs, files in os.walk(source):
+        relative = Path(root).relative_to(source)
+        (target / relative).mkdir(parents=True, exist_ok=True)
+        # Symlinked directories are not descended into but copied as links
+        files += [d for d in dirs if (Path(root) / d).is_symlink()]
+        dirs[:] = [d for d in dirs if not (Path(root) / d).is_symlink()]
+        pairs += [(Path(root) / name, target / relative / name)
+                  for name in files]
+
+    if len(pairs) <= 1:
+        written = [_overwrite_file(src, dst) for src, dst in pairs]
+    else:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=min(COPY_WORKERS, len(pairs))) as pool:
+            written = list(pool.map(lambda pair: _overwrite_file(*pair), pairs))
+    return sum(written), len(pairs)
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from setitup.models.context import Context
+from setitup.models.steps import GuardStep, Step
+from setitup.utils.events import current_package
+
+# ---------------------------------------------------------------------------- #
+#                                  Run Journal                                 #
+# ---------------------------------------------------------------------------- #
+
+StepKey = Tuple[str, int, str]
+
+
+class Journal:
+    """
+    Append-only log of the steps completed by a run, synced to disk after each step, so that
+    --resume can continue a failed run from its failed step. There is one journal per recipe
+    directory, home directory, phase and package list. A step is identified by its
+    package, its position in the package and the hash of its unsubstituted recipe entry, so
+    steps whose recipe changed run again. Guards are never journaled: they run again to restore the state of their package.
+    The journal is removed once a run succeeds.
+    """
+
+    _fd: Optional[int] = None
+    _done: Set[StepKey] = set()
+    _lock = threading.Lock()
+
+    @classmethod
+    def path(cls, packages: List[str], phase: str) -> Path:
+        identity = json.dumps([str(Path(Context.base_directory).resolve()), str(Context.homr_dir),
+                               phase, packages])
+        digest = hashlib.sha256(identity.encode()).hexdigest()[:16]
+        return Context.state_dir / "journals" / f"{phase}-{digest}.jsonl"
+
+    @classmethod
+    def _load(cls, path: Path) -> Set[StepKey]:
+        done: Set[StepKey] = set()
+        if not path.is_file():
+            return done
+        for line in path.read_text().splitlines():
+            try:
+                entry = json.loads(line)
+                done.add((entry["package"], entry["index"], entry["identity"]))
+            except (ValueError, KeyError, TypeError):
+                # Last line torn by a crash
+                continue
+        return done
+
+    @classmethod
+    def open(cls, packages: List[str], phase: str, resume: bool) -> int:
+        """
+        Starts the journal of a run of packages in a phase.
+
+        Args:
+            packages (List[str]): packages of the run, in bundle order.
+            phase (str): "install" or "config".
+            resume (bool): whether to keep and skip the steps completed by the previous run.
+
+        Returns:
+            int: number of completed steps that will be skipped.
+        """
+        path = cls.path(packages, phase)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        cls._done = cls._load(path) if resume else set()
+        flags = os.O_WRONLY | os.O_CREAT | os.O_APPEND
+        cls._fd = os.open(path, flags if resume else flags | os.O_TRUNC, 0o644)
+        return len(cls._done)
+
+    @staticmethod
+    def _key(index: int, step: Step) -> Optional[StepKey]:
+        package = current_package.get()
+        if package is None or isinstance(step, GuardStep):
+            return None
+        return package, index, step.identity()
+
+    @classmethod
+    def done(cls, index: int, step: Step) -> bool:
+        """
+        Checks whether the resumed run already completed this step of the current package.
+        """
+        key = cls._key(index, step)
+        return key is not None and key in cls._done
+
+    @classmethod
+    def record(cls, index: int, step: Step) -> None:
+        """
+        Appends a completed step of the current package and syncs it to disk.
+        """
+        key = cls._key(index, step)
+        if cls._fd is None or key is None:
+            return
+        entry: Dict[str, object] = {"package": key[0], "index": key[1], "identity": key[2],
+                                    "step": f"{step}"}
+        line = f"{json.dumps(entry)}\n".encode()
+        with cls._lock:
+            os.write(cls._fd, line)
+            os.fsync(cls._fd)
+
+    @classmethod
+    def close(cls, packages: List[str], phase: str, ok: bool) -> None:
+        """
+        Closes the journal, and removes it if the run succeeded.
+        """
+        if cls._fd is None:
+            return
+        os.close(cls._fd)
+        cls._fd = None
+        cls._done = set()
+        if ok:
+            cls.path(packages, phase).unlink(missing_ok=True)
@@ -0,0 +1,63 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from setitup.models.context import Context
+
+# ---------------------------------------------------------------------------- #
+#                              Idempotency Ledger                              #
+# ---------------------------------------------------------------------------- #
+
+
+class Ledger:
+    """
+    Records the fingerprints of successful steps so that unchanged steps are skipped on re-runs.
+    Stored as SQLite under Context.state_dir. Shared by all worker threads.
+    """
+
+    _conn: Optional[sqlite3.Connection] = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def path(cls) -> Path:
+        return Context.state_dir / "ledger.sqlite"
+
+    @classmethod
+    def _connect(cls) -> sqlite3.Connection:
+        if cls._conn is None:
+            cls.path().parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(cls.path(), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS steps (fingerprint TEXT PRIMARY KEY, name TEXT, recorded_at REAL, duration REAL)")
+            # Ledgers written before durations were recorded
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(steps)")]
+            if "duration" not in columns:
+                conn.execute("ALTER TABLE steps ADD COLUMN duration REAL")
+            cls._conn = conn
+        return cls._conn
+
+    @classmethod
+    def done(cls, fingerprint: str) -> bool:
+        """
+        Checks whether a step with this fingerprint has succeeded before. Always False with --force.
+        """
+        if Context.force:
+            return False
+        with cls._lock:
+            row = cls._connect().execute(
+                "SELECT 1 FROM steps WHERE fingerprint = ?", (fingerprint,)).fetchone()
+        return row is not None
+
+    @classmethod
+    def record(cls, fingerprint: str, name: str, duration: Optional[float] = None) -> None:
+        """
+        Records a successful step and how long it took.
+        """
+        with cls._lock:
+            conn = cls._connect()
+            conn.execute("INSERT OR REPLACE INTO steps VALUES (?, ?, ?, ?)",
+                         (fingerprint, name, time.time(), duration))
+            conn.commit()
@@ -1,52 +1,146 @@
 import traceback
+from contextlib import contextmanager
+from contextvars import ContextVar
 from functools import partial, wraps
-from typing import Any, Callable, Iterable, List, Optional, ParamSpec, TypeVar
+from time import perf_counter
+from typing import (Any, Awaitable, Callable, Iterable, Iterator, List,
+                    Optional, ParamSpec, TypeVar)
 
 import termcolor
-import yaml
-from setitup.utils.click import Context
+from setitup.models.context import Context
+from setitup.utils.events import Event, EventBus, Sink
 
 colored = partial(termcolor.colored)
 
 
+_buffer: ContextVar[Optional[List[str]]] = ContextVar("buffer", default=None)
+
+
+class StepError(Exception):
+    """
+    Raised by log_step after a failed step has been logged.
+    """
+    pass
+
+
+def echo(*args: Any) -> None:
+    """
+    Prints a line, or appends it to the current thread or task's buffer if one is active.
+    """
+    line = " ".join(str(arg) for arg in args)
+    buffer = _buffer.get()
+    if buffer is None:
+        print(line)
+    else:
+        buffer.append(line)
+
+
+@contextmanager
+def buffered_output() -> Iterator[List[str]]:
+    """
+    Collects everything echoed by the current thread or task into a list of lines.
+
+    Yields:
+        Iterator[List[str]]: buffered lines.
+    """
+    lines: List[str] = []
+    token = _buffer.set(lines)
+    try:
+        yield lines
+    finally:
+        _buffer.reset(token)
+
+
 def fmt_yaml(obj: Any) -> str:
+    # Only needed for dry runs and error reports
+    import yaml
     return yaml.dump(obj, sort_keys=False)
 
 
 def print_yaml(obj: Any):
-    print(fmt_yaml(obj))
+    echo(fmt_yaml(obj))
 
 
 def print_bold(msg: str, color: str = "white"):
-    print(colored(msg, color))
+    echo(colored(msg, color))
 
 
 P = ParamSpec("P")
 T = TypeVar("T")
 
 
+def _details(e: BaseException) -> List[Any]:
+    arg0 = e.args[0] if e.args else e
+    if isinstance(arg0, list):
+        arg0_list: List[Any] = arg0
+        return arg0_list
+    return [arg0]
+
+
+class TerminalSink(Sink):
+    """
+    Renders events as colored terminal output. Uses echo, so output stays grouped per package.
+    """
+
+    @staticmethod
+    def _state(name: str, state: str, color: str) -> None:
+        echo(
+            colored(f"  {name}", color="white"),
+            colored(f"  {state}", color=color),
+        )
+
+    def handle(self, event: Event) -> None:
+        match event.kind:
+            case "section_started":
+                echo(colored(f"{event.name.upper()}", color="magenta"))
+            case "section_failed":
+                echo(
+                    colored(f"{event.name.upper()}", color="magenta"),
+                    colored("  ERROR", color="red"),
+                )
+                for detail in event.details:
+                    echo(detail)
+            case "step_started":
+                self._state(event.name, "STARTED", "cyan")
+            case "step_skipped":
+                self._state(event.name, "SKIPPED", "cyan")
+            case "step_unchanged":
+                self._state(event.name, "UNCHANGED", "cyan")
+            case "step_succeeded":
+                self._state(event.name, "SUCCESS", "green")
+                if Context.verbose and event.output is not None:
+                    echo(colored("Outputs", color="grey"))
+                    echo(event.output)
+            case "step_failed":
+                self._state(event.name, "ERROR", "red")
+                for detail in event.details:
+                    echo(detail)
+            case "run_failed":
+                echo(colored("\nERROR:", color="red"))
+                for detail in event.details:
+                    echo(detail)
+
+
+EventBus.add_sink(TerminalSink())
+
+
 def log_section(name: str) -> Callable[[Callable[P, T]], Callable[P, T]]:
     def _log_section(f: Callable[P, T]) -> Callable[P, T]:
         @wraps(f)
         def wrapper(*args: P.args, **kwargs: P.kwargs) -> T:
-            print(colored(f"{name.upper()}", color="magenta"))
+            EventBus.emit("section_started", name)
+            start = perf_counter()
             try:
                 output = f(*args, **kwargs)
             except Exception as e:
-                print(
-                    colored(f"{name.upper()}",
-                            color="magenta"),
-                    colored("  ERROR", color="red"),
-                )
-                arg0 = e.args[0]
-                if isinstance(arg0, list):
-                    arg0_list: List[Any] = arg0
-                    for arg in arg0_list:
-                        print(arg)
-                else:
-                    print(e)
-                print(traceback.format_exc())
+                # Failed steps have already been reported
+                details = [] if isinstance(e, StepError) else _details(
+                    e) + [traceback.format_exc()]
+                EventBus.emit("section_failed", name,
+                              duration=perf_counter() - start, details=details)
                 exit(1)
+            EventBus.emit("section_ended", name,
+                          duration=perf_counter() - start)
             return output
 
         return wrapper
@@ -54,9 +148,23 @@ def log_section(name: str) -> Callable[[Callable[P, T]], Callable[P, T]]:
     return _log_section
 
 
+def log_unchanged(name: str) -> None:
+    """
+    Logs a step skipped because it already succeeded with the same inputs.
+    """
+    EventBus.emit("step_unchanged", name)
+
+
+def _log_error(name: str, e: Exception, start: float) -> StepError:
+    EventBus.emit("step_failed", name, duration=perf_counter() - start,
+                  status=getattr(e, "status", None), details=_details(e))
+    return StepError(name)
+
+
 def log_step(name: str, run_step: bool) -> Callable[[Callable[P, T]], Callable[P, Optional[T]]]:
     """
-    Prints log message on the start, end and failure of a processing step.
+    Reports the start, end and failure of a processing step to the event bus.
+    Failures are raised as StepError once reported.
 
     Args:
         name (str): name of step.
@@ -70,33 +178,48 @@ def log_step(name: str, run_step: bool) -> Callable[[Callable[P, T]], Callable[P
         def wrapper(*args: P.args, **kwargs: P.kwargs) -> Optional[T]:
             # Step skipped
             if not run_step:
-                print(
-                    colored(f"  {name}", color="white"),
-                    colored("  SKIPPED", color="cyan"),
-                )
+                EventBus.emit("step_skipped", name)
                 return None
-            else:
-                print(
-                    colored(f"  {name}", color="white"),
-                    colored("  STARTED", color="cyan"),
-                )
+            EventBus.emit("step_started", name)
+            start = perf_counter()
             try:
                 output = f(*args, **kwargs)
             except Exception as e:
-                print(
-                    colored(f"  {name}", color="white"),
-                    colored("  ERROR", color="red"),
-                )
-                for arg in e.args[0]:
-                    print(arg)
-                exit(1)
-            print(
-                colored(f"  {name}", color="white"),
-                colored("  SUCCESS", color="green"),
-            )
-            if Context.verbose and output is not None:
-                print(colored("Outputs", color="gray"))
-                print(output)
+                raise _log_error(name, e, start) from e
+            EventBus.emit("step_succeeded", name,
+                          duration=perf_counter() - start, output=output)
+            return output
+
+        return wrapper
+
+    return _log_step
+
+
+def log_step_async(name: str, run_step: bool) -> Callable[[Callable[P, Awaitable[T]]], Callable[P, Awaitable[Optional[T]]]]:
+    """
+    Coroutine version of log_step.
+
+    Args:
+        name (str): name of step.
+        run_step (bool): whether to run or to skip the step.
+
+    Returns:
+        Callable[[Callable[P, Awaitable[T]]], Callable[P, Awaitable[Optional[T]]]]: decorator function.
+    """
+    def _log_step(f: Callable[P, Awaitable[T]]) -> Callable[P, Awaitable[Optional[T]]]:
+        @wraps(f)
+        async def wrapper(*args: P.args, **kwargs: P.kwargs) -> Optional[T]:
+            if not run_step:
+                EventBus.emit("step_skipped", name)
+                return None
+            EventBus.emit("step_started", name)
+            start = perf_counter()
+            try:
+                output = await f(*args, **kwargs)
+            except Exception as e:
+                raise _log_error(name, e, start) from e
+            EventBus.emit("step_succeeded", name,
+                          duration=perf_counter() - start, output=output)
             return output
 
         return wrapper
@@ -105,9 +228,7 @@ def log_step(name: str, run_step: bool) -> Callable[[Callable[P, T]], Callable[P
 
 
 def last_words(logs: str | Iterable[str]):
-    print(colored("\nERROR:", color="red"))
     if isinstance(logs, str):
         logs = [logs]
-    for log in logs:
-        print(log)
+    EventBus.emit("run_failed", "run", details=list(logs))
     exit(1)
@@ -2,11 +2,13 @@ from typing import List
 
 from setitup.models.recipes import Recipes
 from setitup.models.settings import Settings
-from setitup.utils.click import Context
+from setitup.models.context import Context
 from setitup.utils.logging import log_section
+from setitup.utils.profile import profiled
 
 
 @log_section("Parsing packages")
+@profiled("parse_package")
 def parse_package(package: str):
     packages: List[str] = []
 
@@ -0,0 +1,134 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from setitup.models.context import Context
+from setitup.models.steps import GuardStep
+from setitup.utils.executor import (Phase, get_depends, get_steps,
+                                    order_packages, step_fingerprint)
+from setitup.utils.guards import GuardResults
+from setitup.utils.history import History
+from setitup.utils.ledger import Ledger
+from setitup.utils.logging import colored, echo
+
+# ---------------------------------------------------------------------------- #
+#                                Execution Plan                                #
+# ---------------------------------------------------------------------------- #
+
+
+def _plan_steps(package: str, phase: Phase, estimates: Dict[Tuple[str, int, str], float]) -> List[Dict[str, Any]]:
+    """
+    Resolves the steps of a package as a run would: guards are evaluated, later steps are
+    skipped by false guards and steps in the ledger are unchanged. Steps to run are estimated
+    from the run history.
+    """
+    planned: List[Dict[str, Any]] = []
+    Context.state.run_step = True
+    for index, step in enumerate(get_steps(package, phase)):
+        name = f"{step}"
+        estimate: Optional[float] = 0.0
+        if isinstance(step, GuardStep):
+            action = "guard"
+            Context.state.run_step = step.run_step
+            name = f"{name} => {'RUN' if Context.state.run_step else 'SKIP'}"
+        elif not Context.state.run_step:
+            action = "skip"
+        else:
+            fingerprint = step_fingerprint(step)
+            if fingerprint is not None and Ledger.done(fingerprint):
+                action = "unchanged"
+            else:
+                action = "run"
+                estimate = estimates.get((package, index, step.identity()))
+        planned.append({"index": index, "step": name,
+                       "action": action, "estimate": estimate})
+    return planned
+
+
+def build_plan(packages: List[str], phase: Phase) -> Dict[str, Any]:
+    """
+    Plans a run without executing anything.
+
+    Estimates are the p50 of the successful runs of each step in the history. Steps without
+    history count as zero and are listed in unknown_steps.
+
+    Args:
+        packages (List[str]): packages in bundle order.
+        phase (Phase): "install" or "config".
+
+    Returns:
+        Dict[str, Any]: stages, steps per package, critical path and estimated durations.
+    """
+    GuardResults.invalidate()
+    stages = order_packages(packages)
+    estimates = History.estimates(packages, phase)
+    steps = {package: _plan_steps(package, phase, estimates) for package in packages}
+    durations = {package: sum(step["estimate"] or 0.0 for step in steps[package])
+                 for package in packages}
+
+    # Longest chain of dependencies, assuming enough jobs for every stage
+    finish: Dict[str, float] = {}
+    previous: Dict[str, Optional[str]] = {}
+    for stage in stages:
+        for package in stage:
+            depends = get_depends(package, packages)
+            slowest = max(depends, key=lambda dep: finish[dep], default=None)
+            previous[package] = slowest
+            finish[package] = durations[package] + \
+                (finish[slowest] if slowest is not None else 0.0)
+
+    # Ties go to the later package, so the path ends at the package finishing last
+    critical_path: List[str] = []
+    ordered = [package for stage in stages for package in stage]
+    current = max(reversed(ordered), key=lambda pk: finish[pk], default=None)
+    while current is not None:
+        critical_path.insert(0, current)
+        current = previous[current]
+
+    return {
+        "phase": phase,
+        "stages": stages,
+        "packages": {package: {"depends": get_depends(package, packages),
+                               "estimate": durations[package],
+                               "steps": steps[package]}
+                     for package in packages},
+        "critical_path": critical_path,
+        "estimate": max(finish.values(), default=0.0),
+        "serial_estimate": sum(durations.values()),
+        "unknown_steps": sum(step["action"] == "run" and step["estimate"] is None
+                             for package_steps in steps.values() for step in package_steps),
+    }
+
+
+ACTION_COLORS = {"run": "green", "skip": "grey",
+                 "unchanged": "cyan", "guard": "yellow"}
+
+
+def _fmt_estimate(estimate: Optional[float]) -> str:
+    return "?" if estimate is None else f"{estimate:.1f}s"
+
+
+def print_plan(plan: Dict[str, Any]) -> None:
+    """
+    Prints a plan built by build_plan.
+    """
+    critical = set(plan["critical_path"])
+    for number, stage in enumerate(plan["stages"], 1):
+        echo(colored(f"Stage {number}", color="magenta") +
+             f" ({len(stage)} in parallel)")
+        for package in stage:
+            info = plan["packages"][package]
+            marker = colored(" *", color="red") if package in critical else ""
+            echo(colored(f"  [{package}]", color="yellow") +
+                 f" ~{_fmt_estimate(info['estimate'])}{marker}")
+            for step in info["steps"]:
+                action = colored(f"{step['action'].upper():<9}",
+                                 color=ACTION_COLORS[step["action"]])
+                estimate = f" ~{_fmt_estimate(step['estimate'])}" if step["action"] == "run" else ""
+                echo(f"    {action} {step['step']}{estimate}")
+
+    echo("")
+    echo(f"Critical path (*): {' -> '.join(plan['critical_path'])}")
+    echo(f"Estimated: {plan['estimate']:.1f}s with enough jobs, "
+         f"{plan['serial_estimate']:.1f}s with one job")
+    if plan["unknown_steps"]:
+        echo(colored(f"{plan['unknown_steps']} steps to run have no history and count as 0s",
+                     color="grey"))
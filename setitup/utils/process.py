@@ -0,0 +1,224 @@
+import os
+import selectors
+import signal
+import subprocess
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Deque, Dict, Iterator, List, Optional
+
+from setitup.models.context import Context
+from setitup.utils.logging import colored, echo
+from setitup.utils.profile import Profiler
+
+if TYPE_CHECKING:
+    import asyncio
+
+TAIL_LINES = 50
+MAX_LINE_BYTES = 64 * 1024
+CHUNK_BYTES = 64 * 1024
+
+# ---------------------------------------------------------------------------- #
+#                              Subprocess Engine                               #
+# ---------------------------------------------------------------------------- #
+
+
+class CommandError(Exception):
+    """
+    A command failed or timed out. Carries the exit status for error reports.
+    """
+
+    def __init__(self, messages: List[str], status: int) -> None:
+        super().__init__(messages)
+        self.status = status
+
+
+class CommandResult:
+    """
+    Outcome of a shell command. Only the last lines of output are kept.
+    """
+
+    def __init__(self, status: int, tail: List[str], output_size: int, timed_out: bool = False) -> None:
+        self.status = status
+        self.tail = tail
+        self.output_size = output_size
+        self.timed_out = timed_out
+
+    @property
+    def ok(self) -> bool:
+        return self.status == 0 and not self.timed_out
+
+
+class OutputMeter:
+    """
+    Counts the output bytes of the commands run by the step in the current thread or task.
+    """
+
+    _current: ContextVar[Optional["OutputMeter"]] = ContextVar(
+        "output_meter", default=None)
+
+    def __init__(self) -> None:
+        self.size = 0
+
+    @classmethod
+    @contextmanager
+    def measure(cls) -> Iterator["OutputMeter"]:
+        meter = cls()
+        token = cls._current.set(meter)
+        try:
+            yield meter
+        finally:
+            cls._current.reset(token)
+
+    @classmethod
+    def add(cls, size: int) -> None:
+        meter = cls._current.get()
+        if meter is not None:
+            meter.size += size
+
+
+class _OutputReader:
+    """
+    Splits output chunks of stdout and stderr into lines, keeping a ring buffer of the last lines.
+    """
+
+    def __init__(self, stream: bool, tail_lines: int) -> None:
+        self.stream = stream
+        self.tail: Deque[str] = deque(maxlen=tail_lines)
+        self.output_size = 0
+        self.partial: Dict[bool, bytes] = {}
+
+    def emit(self, line: bytes, is_err: bool) -> None:
+        text = line.decode("utf-8", errors="replace").rstrip("\r\n")
+        self.tail.append(text)
+        if self.stream:
+            echo(colored(f"    {text}", color="red") if is_err else f"    {text}")
+
+    def feed(self, chunk: bytes, is_err: bool) -> None:
+        # Empty chunk means end of stream
+        if not chunk:
+            if self.partial.get(is_err):
+                self.emit(self.partial.pop(is_err), is_err)
+            return
+        self.output_size += len(chunk)
+        *lines, rest = (self.partial.get(is_err, b"") + chunk).split(b"\n")
+        for line in lines:
+            self.emit(line, is_err)
+        # Flush unterminated lines such as progress bars once too long
+        if len(rest) > MAX_LINE_BYTES:
+            self.emit(rest, is_err)
+            rest = b""
+        self.partial[is_err] = rest
+
+    def result(self, status: int, timed_out: bool = False) -> CommandResult:
+        OutputMeter.add(self.output_size)
+        return CommandResult(status, list(self.tail), self.output_size, timed_out)
+
+
+def _kill(pid: int, own_group: bool) -> None:
+    try:
+        if own_group:
+            os.killpg(pid, signal.SIGKILL)
+        else:
+            os.kill(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def _reap(proc: subprocess.Popen) -> int:
+    """
+    Waits for the process with wait4 so its resource usage can be attributed to the current step.
+    """
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    Profiler.add_child_usage(usage.ru_utime, usage.ru_stime, usage.ru_maxrss)
+    return proc.returncode
+
+
+def run_command(cmd: str, stream: bool = False, tail_lines: int = TAIL_LINES, timeout: Optional[float] = None) -> CommandResult:
+    """
+    Runs a shell command, reading stdout and stderr line by line as they arrive.
+    Memory use is bounded by the ring buffer of the last lines.
+
+    Args:
+        cmd (str): shell command.
+        stream (bool, optional): whether to echo each line as it arrives. Defaults to False.
+        tail_lines (int, optional): number of trailing lines to keep. Defaults to TAIL_LINES.
+        timeout (Optional[float], optional): seconds before the command and its children are killed. Defaults to None.
+
+    Returns:
+        CommandResult: exit status, last lines of output and total output size in bytes.
+    """
+    reader = _OutputReader(stream, tail_lines)
+    deadline = None if timeout is None else time.monotonic() + timeout
+
+    # Commands with a timeout get their own process group so children die with them
+    proc = subprocess.Popen(cmd, shell=True, env=Context.env, start_new_session=timeout is not None,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    assert proc.stdout is not None and proc.stderr is not None
+
+    with selectors.DefaultSelector() as selector:
+        selector.register(proc.stdout, selectors.EVENT_READ, False)
+        selector.register(proc.stderr, selectors.EVENT_READ, True)
+        while selector.get_map():
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                _kill(proc.pid, True)
+                status = _reap(proc)
+                proc.stdout.close()
+                proc.stderr.close()
+                return reader.result(status, timed_out=True)
+            for key, _ in selector.select(remaining):
+                chunk = os.read(key.fd, CHUNK_BYTES)
+                if not chunk:
+                    selector.unregister(key.fileobj)
+                reader.feed(chunk, key.data)
+
+    proc.stdout.close()
+    proc.stderr.close()
+    return reader.result(_reap(proc))
+
+
+async def run_command_async(cmd: str, stream: bool = False, tail_lines: int = TAIL_LINES, timeout: Optional[float] = None) -> CommandResult:
+    """
+    Coroutine version of run_command. The command is killed if the calling task is cancelled.
+
+    Args:
+        cmd (str): shell command.
+        stream (bool, optional): whether to echo each line as it arrives. Defaults to False.
+        tail_lines (int, optional): number of trailing lines to keep. Defaults to TAIL_LINES.
+        timeout (Optional[float], optional): seconds before the command and its children are killed. Defaults to None.
+
+    Returns:
+        CommandResult: exit status, last lines of output and total output size in bytes.
+    """
+    import asyncio
+
+    reader = _OutputReader(stream, tail_lines)
+    # The event loop's child watcher reaps the process, so no per-command resource usage is profiled
+    proc = await asyncio.create_subprocess_shell(cmd, env=Context.env, start_new_session=True,
+                                                 stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+    assert proc.stdout is not None and proc.stderr is not None
+
+    async def pump(pipe: "asyncio.StreamReader", is_err: bool) -> None:
+        while True:
+            chunk = await pipe.read(CHUNK_BYTES)
+            reader.feed(chunk, is_err)
+            if not chunk:
+                return
+
+    async def communicate() -> int:
+        await asyncio.gather(pump(proc.stdout, False), pump(proc.stderr, True))
+        return await proc.wait()
+
+    try:
+        status = await asyncio.wait_for(communicate(), timeout)
+    except asyncio.TimeoutError:
+        _kill(proc.pid, True)
+        return reader.result(await proc.wait(), timed_out=True)
+    except asyncio.CancelledError:
+        _kill(proc.pid, True)
+        await proc.wait()
+        raise
+    return reader.result(status)
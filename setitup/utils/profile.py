@@ -0,0 +1,168 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from pathlib import Path
+from typing import (Any, Callable, Dict, Iterator, List, Optional, ParamSpec,
+                    TypeVar)
+
+from setitup.utils.events import current_package
+from setitup.utils.logging import colored, echo
+
+P = ParamSpec("P")
+T = TypeVar("T")
+
+# ---------------------------------------------------------------------------- #
+#                                   Profiling                                  #
+# ---------------------------------------------------------------------------- #
+
+
+class Span:
+    """
+    Timing of one phase or step, with the resource usage of its child processes.
+    """
+    __slots__ = ("name", "category", "package", "thread", "start", "wall", "cpu",
+                 "child_user", "child_sys", "child_max_rss")
+
+    def __init__(self, name: str, category: str) -> None:
+        self.name = name
+        self.category = category
+        self.package = current_package.get()
+        self.thread = threading.get_ident()
+        self.start = time.perf_counter()
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.child_user = 0.0
+        self.child_sys = 0.0
+        # Kilobytes on Linux. Includes the forked interpreter before exec, so it is a lower bound
+        # of what a command is charged rather than what it allocated
+        self.child_max_rss = 0
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar(
+    "current_span", default=None)
+
+
+class Profiler:
+    """
+    Collects spans when profiling is enabled. Disabled spans cost a single attribute check.
+    """
+
+    enabled: bool = False
+    origin: float = time.perf_counter()
+    spans: List[Span] = []
+    _lock = threading.Lock()
+
+    @classmethod
+    def enable(cls) -> None:
+        cls.enabled = True
+        cls.origin = time.perf_counter()
+        cls.spans = []
+
+    @classmethod
+    def add_child_usage(cls, user: float, sys: float, max_rss: int) -> None:
+        """
+        Attributes the resource usage of a finished child process to the current span.
+        """
+        span = _current_span.get()
+        if span is None:
+            return
+        span.child_user += user
+        span.child_sys += sys
+        span.child_max_rss = max(span.child_max_rss, max_rss)
+
+    @classmethod
+    def summary(cls) -> None:
+        """
+        Prints spans sorted by wall time.
+        """
+        if not cls.spans:
+            return
+        rows = sorted(cls.spans, key=lambda span: span.wall, reverse=True)
+        header = f"{'wall(s)':>9} {'cpu(s)':>8} {'child usr':>10} {'child sys':>10} {'max rss(MB)':>12}  name"
+        echo(colored("PROFILE", color="magenta"))
+        echo(header)
+        for span in rows:
+            name = f"[{span.package}] {span.name}" if span.package else span.name
+            echo(f"{span.wall:9.3f} {span.cpu:8.3f} {span.child_user:10.3f} {span.child_sys:10.3f} "
+                 f"{span.child_max_rss / 1024:12.1f}  {name}")
+
+    @classmethod
+    def report(cls, trace_path: Optional[Path] = None) -> None:
+        """
+        Prints the summary and writes the trace, if requested. Registered to run at exit.
+
+        Args:
+            trace_path (Optional[Path], optional): where to write the Chrome trace. Defaults to None.
+        """
+        cls.summary()
+        if trace_path is not None:
+            cls.write_trace(trace_path)
+
+    @classmethod
+    def write_trace(cls, file_path: Path) -> None:
+        """
+        Writes spans in the Chrome trace event format, which speedscope and Perfetto can open.
+        """
+        events: List[Dict[str, Any]] = [
+            {
+                "name": span.name,
+                "cat": span.category,
+                "ph": "X",
+                "ts": (span.start - cls.origin) * 1e6,
+                "dur": span.wall * 1e6,
+                "pid": os.getpid(),
+                "tid": span.package or span.thread,
+                "args": {"cpu": span.cpu, "child_user": span.child_user,
+                         "child_sys": span.child_sys, "child_max_rss_kb": span.child_max_rss},
+            }
+            for span in cls.spans
+        ]
+        file_path.write_text(json.dumps(
+            {"traceEvents": events, "displayTimeUnit": "ms"}))
+
+
+@contextmanager
+def profile_span(name: str, category: str) -> Iterator[Optional[Span]]:
+    """
+    Measures wall and CPU time of the enclosed block when profiling is enabled.
+
+    Args:
+        name (str): name of the span.
+        category (str): e.g. "phase" or "step".
+
+    Yields:
+        Iterator[Optional[Span]]: the span, or None when profiling is disabled.
+    """
+    if not Profiler.enabled:
+        yield None
+        return
+    span = Span(name, category)
+    cpu_start = time.thread_time()
+    token = _current_span.set(span)
+    try:
+        yield span
+    finally:
+        _current_span.reset(token)
+        span.wall = time.perf_counter() - span.start
+        span.cpu = time.thread_time() - cpu_start
+        with Profiler._lock:
+            Profiler.spans.append(span)
+
+
+def profiled(name: str) -> Callable[[Callable[P, T]], Callable[P, T]]:
+    """
+    Profiles every call of a function as a phase.
+    """
+    def _profiled(f: Callable[P, T]) -> Callable[P, T]:
+        @wraps(f)
+        def wrapper(*args: P.args, **kwargs: P.kwargs) -> T:
+            with profile_span(name, "phase"):
+                return f(*args, **kwargs)
+
+        return wrapper
+
+    return _profiled
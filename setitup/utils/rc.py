@@ -1,14 +1,17 @@
-import re
-from functools import partial
+import hashlib
+import threading
+from contextlib import contextmanager
 from os import environ
 from pathlib import Path
-from typing import Dict, Iterable, List, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
-from setitup.utils.utils import (get_home_dir, last_words, read,
-                                 run_python)
+from setitup.models.context import Context
+from setitup.utils.io import file_digest, resolve_path, write_atomic
+from setitup.utils.logging import last_words
 
 START_MARKER = "# ENV_SETUP_SECTION:"
 END_MARKER = "# ENV_SETUP_SECTION_END:"
+DEFAULT_MARKERS = (START_MARKER, END_MARKER)
 
 # ---------------------------------------------------------------------------- #
 #                              rc Files Management                             #
@@ -16,14 +19,37 @@ END_MARKER = "# ENV_SETUP_SECTION_END:"
 
 
 class RcFile():
-    def __init__(self, info: List[str] | Dict[str, List[str]] | Tuple[List[str], Dict[str, List[str]]]) -> None:
+    def __init__(self, info: List[str] | Dict[str, List[str]] | Tuple[List[str], Dict[str, List[str]]],
+                 markers: Tuple[str, str] = DEFAULT_MARKERS) -> None:
+        self.markers = markers
+        # Section digests, dropped when a section changes
+        self._digests: Dict[str, str] = {}
         if isinstance(info, dict):
             self.sections = list(info.keys())
             self.content = info
         elif isinstance(info, tuple):
             self.sections, self.content = info
         else:
-            self.sections, self.content = self.parse_text(info)
+            self.sections, self.content = self.parse_text(info, markers)
+
+    def digest(self, section: str) -> str:
+        """
+        Hash of the content of a section, computed once.
+        """
+        digest = self._digests.get(section)
+        if digest is None:
+            digest = self._digests[section] = hashlib.sha256(
+                "\n".join(self.content[section]).encode()).hexdigest()
+        return digest
+
+    def changed_sections(self, other: "RcFile", sections: Optional[Iterable[str]] = None) -> List[str]:
+        """
+        Sections of other, or the given sections of other, that are missing here or have
+        different content.
+        """
+        return [section for section in (other.sections if sections is None else sections)
+                if not section.startswith("none")
+                and (section not in self.content or self.digest(section) != other.digest(section))]
 
     def select(self, sections: str | Iterable[str]) -> "RcFile":
         if isinstance(sections, str):
@@ -33,7 +59,11 @@ class RcFile():
             if section not in self.content:
                 last_words(f"Missing section {section}.")
             new_content[section] = self.content[section]
-        return RcFile((list(sections), new_content))
+        selected = RcFile((list(new_content), new_content), self.markers)
+        # Content is shared, so are the digests computed so far
+        selected._digests = {section: self._digests[section]
+                             for section in new_content if section in self._digests}
+        return selected
 
     def update(self, other: "RcFile") -> None:
         other_sections = list(
@@ -41,43 +71,69 @@ class RcFile():
         for other_section in other_sections:
             if other_section in self.sections and other_section in self.content:
                 self.content[other_section] = other.content[other_section]
+                self._digests.pop(other_section, None)
             elif (other_section not in self.sections) and (other_section not in self.content):
                 self.sections.append(other_section)
                 self.content[other_section] = other.content[other_section]
             else:
                 last_words("If this prints, I am an idiot.")
 
-    def to_text(self) -> str:
-        text = ""
+    def lines(self) -> Iterator[str]:
+        start_marker, end_marker = self.markers
         for section in self.sections:
 
             is_none = section.startswith("none")
 
             if not is_none:
-                text += f"{START_MARKER} {section}\n"
+                yield f"{start_marker} {section}"
 
-            text += "\n".join(self.content[section]) + "\n"
+            content = self.content[section]
+            for item in content:
+                yield from item.split("\n")
+            if not content:
+                yield ""
 
             if not is_none:
-                text += f"{END_MARKER} {section}\n"
-
-        return re.sub(r"\n{2,}", "\n\n", text).strip()
+                yield f"{end_marker} {section}"
 
-    def write(self, path: Path) -> None:
-        with open(path, "w") as f:
-            f.write(self.to_text())
+    def to_text(self) -> str:
+        """
+        Renders the file in linear time, keeping at most one empty line in a row.
+        """
+        text: List[str] = []
+        last_empty = True
+        for line in self.lines():
+            is_empty = line == ""
+            if not (is_empty and last_empty):
+                text.append(line)
+            last_empty = is_empty
+
+        return "\n".join(text).strip()
+
+    def write(self, path: Path) -> bool:
+        """
+        Writes the file atomically. Skipped if the file already holds the same text.
+
+        Returns:
+            bool: whether the file was written.
+        """
+        return write_atomic(path, self.to_text().encode())
 
     @staticmethod
-    def parse_text(text: List[str]) -> Tuple[List[str], Dict[str, List[str]]]:
+    def parse_text(text: List[str], markers: Tuple[str, str] = DEFAULT_MARKERS) -> Tuple[List[str], Dict[str, List[str]]]:
+        start_marker, end_marker = markers
         sections = ["none_0"]
         content: Dict[str, List[str]] = {"none_0": []}
         none_count = 0
         current_section = "none_0"
 
         for line in text:
-            # Identify markers
-            is_section_start = line.startswith(START_MARKER)
-            is_section_end = line.startswith(END_MARKER)
+            line = line.rstrip("\n")
+
+            # Identify markers. End markers may start with the start marker, e.g. "# >>>" and "# >>> end"
+            is_section_end = line.startswith(end_marker)
+            is_section_start = line.startswith(
+                start_marker) and not is_section_end
 
             if (not is_section_start) and (not is_section_end):
                 # For normal line, append to current section
@@ -85,7 +141,7 @@ class RcFile():
 
             elif is_section_start:
                 # At section start, append keys
-                current_section = line.replace(START_MARKER, "").strip()
+                current_section = line.replace(start_marker, "", 1).strip()
                 if current_section in content:
                     last_words(
                         f"Duplicated section {current_section}. Please manually fix it.")
@@ -94,7 +150,7 @@ class RcFile():
 
             elif is_section_end:
                 # At section start, append keys
-                ending_section = line.replace(END_MARKER, "").strip()
+                ending_section = line.replace(end_marker, "", 1).strip()
                 if ending_section != current_section:
                     last_words(
                         f"Missing end marker for section {current_section}. Please manually fix it.")
@@ -108,7 +164,7 @@ class RcFile():
 
         # Check last ending marker
         if not current_section.startswith("none"):
-            ending_section = text[-1].replace(END_MARKER, "").strip()
+            ending_section = text[-1].rstrip("\n").replace(end_marker, "", 1).strip()
             if ending_section != current_section:
                 last_words(
                     f"Missing end marker for section {current_section}. Please manually fix it.")
@@ -121,48 +177,201 @@ class RcFile():
         return final_sections, final_content
 
 
-RC_TEMPLATE = RcFile(read(".shellrc").split("\n"))
+RC_TEMPLATE_PATH = "recipes/resources/.shellrc"
+RC_FILES = [".zshrc", ".bashrc"]
+
+_rc_template: Optional[RcFile] = None
+
+
+def get_rc_template() -> RcFile:
+    """
+    Reads the .shellrc template of the input directory once.
+    """
+    global _rc_template
+    if _rc_template is None:
+        _rc_template = RcFile(
+            resolve_path(RC_TEMPLATE_PATH).read_text().splitlines())
+    return _rc_template
+
+
+_templates: Dict[Tuple[str, str, Tuple[str, str]], RcFile] = {}
+
+
+def load_rc(path: Path, markers: Tuple[str, str] = DEFAULT_MARKERS) -> RcFile:
+    """
+    Parses a template once per content and markers. The result must not be modified.
+
+    Args:
+        path (Path): path to the template.
+        markers (Tuple[str, str], optional): start and end markers of sections. Defaults to DEFAULT_MARKERS.
+
+    Returns:
+        RcFile: parsed template, with section digests kept across calls.
+    """
+    key = (str(path), file_digest(path), markers)
+    template = _templates.get(key)
+    if template is None:
+        template = _templates[key] = RcFile(
+            path.read_text().splitlines(), markers)
+    return template
 
 
 def get_rc_path() -> Path:
     if environ.get("ENV_SETUP_DRY_RUN"):
         return Path("test.sh")
-    rc_path = get_home_dir() / ".local" / ".shellrc"
-    if rc_path.exists() and rc_path.is_file():
-        return Path(rc_path)
-    elif not rc_path.exists():
-        with open(rc_path, "w") as _:
-            pass
-        return Path(rc_path)
-    else:
+    rc_path = Context.homr_dir / ".local" / ".shellrc"
+    if rc_path.exists() and not rc_path.is_file():
         last_words(
             f"Something weird is going on with you {rc_path}. Consider deleting it.")
+    return rc_path
 
 
 def get_rc() -> RcFile:
-    return RcFile(open(get_rc_path(), "r").readlines())
+    rc_path = get_rc_path()
+    return RcFile(rc_path.read_text().splitlines() if rc_path.is_file() else [])
 
 
-@run_python
-def _update_rc(info: List[str] | Dict[str, List[str]]) -> None:
-    local_rc = get_rc()
+# ---------------------------------------------------------------------------- #
+#                                Rc Transactions                               #
+# ---------------------------------------------------------------------------- #
 
-    if isinstance(info, dict):
-        new_rc = RcFile(info)
-    else:
-        new_rc = RC_TEMPLATE.select(info)
-    local_rc.update(new_rc)
-    local_rc.write(get_rc_path())
 
+class RcTransaction:
+    """
+    Collects rc section updates and line additions from all steps of a run, then applies them
+    with one read and one atomic write per file. Safe to use from several threads.
+    """
 
-update_rc = partial(_update_rc, "update ~/.local/.shellrc")
+    active: Optional["RcTransaction"] = None
 
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.updates: Dict[Path, RcFile] = {}
+        # Dicts act as insertion-ordered sets
+        self.lines: Dict[Path, Dict[str, None]] = {}
 
-@run_python
-def add_rc_line(line: str, files: List[str] = [".zshrc", ".bashrc"]) -> None:
-    for file in files:
-        lines = open(get_home_dir() / file, "r").readlines()
-        if line not in [item.strip() for item in lines]:
-            lines.append(line + "\n")
-        with open(get_home_dir() / file, "w") as f:
-            f.writelines(lines)
+    def update_rc(self, info: List[str] | Dict[str, List[str]] | RcFile, path: Optional[Path] = None) -> None:
+        if isinstance(info, RcFile):
+            new_rc = info
+        elif isinstance(info, dict):
+            new_rc = RcFile(info)
+        else:
+            new_rc = get_rc_template().select(info)
+        path = path or get_rc_path()
+        with self._lock:
+            if path in self.updates:
+                if self.updates[path].markers != new_rc.markers:
+                    raise ValueError(
+                        [f"Conflicting section markers for {path}", f"{self.updates[path].markers} and {new_rc.markers}"])
+                self.updates[path].update(new_rc)
+            else:
+                self.updates[path] = new_rc
+
+    def add_rc_line(self, line: str, files: List[str] = RC_FILES) -> None:
+        with self._lock:
+            for file in files:
+                self.lines.setdefault(Context.homr_dir / file, {})[line] = None
+
+    def _apply(self, path: Path) -> bool:
+        text = path.read_text() if path.is_file() else ""
+
+        if path in self.updates:
+            update = self.updates[path]
+            rc = RcFile(text.splitlines(), update.markers)
+            # Files whose sections all match are not re-rendered
+            if rc.changed_sections(update):
+                rc.update(update)
+                text = rc.to_text()
+
+        if path in self.lines:
+            existing = {line.strip() for line in text.splitlines()}
+            new_lines = [line for line in self.lines[path]
+                         if line.strip() not in existing]
+            if new_lines:
+                if text and not text.endswith("\n"):
+                    text += "\n"
+                text += "\n".join(new_lines) + "\n"
+
+        return write_atomic(path, text.encode())
+
+    def flush(self, path: Path) -> bool:
+        """
+        Applies the changes collected for one file now, e.g. before the step that made them
+        is recorded as done.
+
+        Returns:
+            bool: whether the file was written.
+        """
+        with self._lock:
+            if path not in self.updates and path not in self.lines:
+                return False
+            written = self._apply(path)
+            self.updates.pop(path, None)
+            self.lines.pop(path, None)
+        return written
+
+    def commit(self) -> List[Path]:
+        """
+        Applies all collected changes.
+
+        Returns:
+            List[Path]: files that were written. Unchanged files are not touched.
+        """
+        with self._lock:
+            targets = list(dict.fromkeys([*self.updates, *self.lines]))
+            written = [path for path in targets if self._apply(path)]
+            self.updates.clear()
+            self.lines.clear()
+        return written
+
+
+@contextmanager
+def rc_transaction() -> Iterator[RcTransaction]:
+    """
+    Makes update_rc and add_rc_line collect their changes until the block exits.
+    Changes are committed even if the block fails, since they come from steps that succeeded.
+
+    Yields:
+        Iterator[RcTransaction]: active transaction.
+    """
+    transaction = RcTransaction()
+    previous = RcTransaction.active
+    RcTransaction.active = transaction
+    try:
+        yield transaction
+    finally:
+        RcTransaction.active = previous
+        transaction.commit()
+
+
+def update_rc(info: List[str] | Dict[str, List[str]] | RcFile, path: Optional[Path] = None) -> None:
+    """
+    Updates sections of ~/.local/.shellrc or path, either from the template (section names),
+    explicit content or a prepared RcFile, which also sets the section markers.
+    Applied when the active transaction commits, or immediately if there is none.
+    """
+    if RcTransaction.active is not None:
+        RcTransaction.active.update_rc(info, path)
+        return
+    with rc_transaction() as transaction:
+        transaction.update_rc(info, path)
+
+
+def flush_rc(path: Path) -> None:
+    """
+    Writes the changes to path collected by the active transaction, if any.
+    """
+    if RcTransaction.active is not None:
+        RcTransaction.active.flush(path)
+
+
+def add_rc_line(line: str, files: List[str] = RC_FILES) -> None:
+    """
+    Appends a line to rc files in the home directory unless already present.
+    Applied when the active transaction commits, or immediately if there is none.
+    """
+    if RcTransaction.active is not None:
+        RcTransaction.active.add_rc_line(line, files)
+        return
+    with rc_transaction() as transaction:
+        transaction.add_rc_line(line, files)
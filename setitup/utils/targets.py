@@ -0,0 +1,117 @@
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from shutil import rmtree
+from tempfile import mkdtemp
+from typing import List, Tuple
+
+from setitup.models.context import ENV, Context
+from setitup.models.targets import Target
+from setitup.utils.events import EventBus
+from setitup.utils.executor import (Phase, prefetch_steps, reset_guards,
+                                    run_packages)
+from setitup.utils.fetch import Downloader
+from setitup.utils.logging import colored, echo, last_words
+
+# ---------------------------------------------------------------------------- #
+#                                 Multi-Target                                 #
+# ---------------------------------------------------------------------------- #
+
+# name, whether it succeeded, seconds, log file
+TargetResult = Tuple[str, bool, float, Path]
+
+
+def prefetch_targets(targets: List[Target], packages: List[str], phase: Phase) -> None:
+    """
+    Downloads and mirrors what the steps of all targets need, once, into the shared cache.
+    Guards are evaluated in the environment of each target. Targets that resolve to the same
+    URLs share one download.
+    """
+    try:
+        for target in targets:
+            target.apply()
+            reset_guards()
+            prefetch_steps(packages, phase)
+        Downloader.drain()
+    finally:
+        Context.env = ENV
+        Context.homr_dir = Path(ENV["HOME"])
+        reset_guards()
+
+
+def _run_target(target: Target, packages: List[str], phase: Phase, log_path: Path) -> TargetResult:
+    """
+    Runs in a forked worker, which inherits the parsed catalog. Output goes to the target's log.
+    Each target gets its own context.tmp_dir, removed when it finishes. Targets share downloads
+    and clones only through the fetch cache and the git mirrors.
+    """
+    start = time.perf_counter()
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(log_path, "w") as log:
+        os.dup2(log.fileno(), sys.stdout.fileno())
+        os.dup2(log.fileno(), sys.stderr.fileno())
+    parent_tmp_dir = Context.tmp_dir
+    Context.tmp_dir = Path(mkdtemp(prefix=f"setitup-{target.name}-"))
+    ok = False
+    try:
+        target.apply()
+        echo(colored(f"Target {target.name} ({target.home})", color="magenta"))
+        run_packages(packages, phase, resume=Context.resume)
+        ok = True
+    except SystemExit:
+        # last_words already reported the failure
+        pass
+    except Exception as e:
+        echo(colored(f"{type(e).__name__}: {e}", color="red"))
+    finally:
+        EventBus.flush()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        # Workers exit without running atexit handlers and may run further targets
+        rmtree(Context.tmp_dir, ignore_errors=True)
+        Context.tmp_dir = parent_tmp_dir
+    return target.name, ok, time.perf_counter() - start, log_path
+
+
+def run_targets(targets: List[Target], packages: List[str], phase: Phase, jobs: int, log_dir: Path) -> None:
+    """
+    Runs the steps of packages for many home directories or prefixes on a pool of worker
+    processes. Workers are forked after parsing, so the catalog is parsed once, and share the
+    ledger, history and download caches on disk. Each target runs its packages in order, with
+    its output in log_dir/<name>.log. Exits with status 1 if any target failed.
+
+    Args:
+        targets (List[Target]): targets to provision.
+        packages (List[str]): packages to run, in bundle order.
+        phase (Phase): "install" or "config".
+        jobs (int): number of targets to run at once.
+        log_dir (Path): directory of the per-target logs.
+    """
+    prefetch_targets(targets, packages, phase)
+
+    # Nothing buffered in this process may be written again by the workers
+    EventBus.flush()
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    results: List[TargetResult] = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("fork")) as pool:
+        futures = [pool.submit(_run_target, target, packages, phase, log_dir / f"{target.name}.log")
+                   for target in targets]
+        for future in as_completed(futures):
+            name, ok, elapsed, log_path = result = future.result()
+            results.append(result)
+            state = colored("SUCCESS", color="green") if ok else colored(
+                "ERROR", color="red")
+            echo(f"  {name}  {state}  {elapsed:.1f}s  {log_path}")
+
+    failed = sorted(name for name, ok, _, _ in results if not ok)
+    echo(f"\n{len(results) - len(failed)} of {len(results)} targets succeeded "
+         f"in {time.perf_counter() - start:.1f}s")
+    if failed:
+        last_words([f"Failed to {phase} {', '.join(failed)}.",
+                    f"See the logs in {log_dir}."])
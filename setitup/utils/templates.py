@@ -0,0 +1,146 @@
+import re
+from functools import lru_cache
+from string import Formatter
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from setitup.models.context import Context
+
+# ---------------------------------------------------------------------------- #
+#                             Substitution Templates                           #
+# ---------------------------------------------------------------------------- #
+
+
+class EnvView:
+    """
+    Read-only attribute view of Context.env. Missing variables resolve to None.
+    Always reads the current Context.env, so nothing is copied.
+    """
+
+    def __getattr__(self, name: str) -> Optional[str]:
+        return Context.env.get(name)
+
+    def __getitem__(self, name: str) -> Optional[str]:
+        return Context.env.get(name)
+
+
+_namespace: Dict[str, Any] = {}
+
+
+def get_namespace() -> Dict[str, Any]:
+    """
+    Objects available to templates. Built once; every object reads live state.
+    """
+    if not _namespace:
+        # Settings imports the validators next to sub()
+        from setitup.models.settings import Settings
+        _namespace.update(settings=Settings, context=Context, env=EnvView())
+    return _namespace
+
+
+# (literal text, field root, accessors, conversion, format spec)
+Accessor = Tuple[bool, Any]
+Part = Tuple[str, Optional[str], List[Accessor], Optional[str], str]
+
+
+def split_field(field_name: str) -> Tuple[str, List[Accessor]]:
+    """
+    Splits a field like env.HOME or settings[key].name into its root and accessors,
+    with the grammar of str.format. Indices made of digits are integers.
+
+    Raises:
+        ValueError: the field is malformed.
+    """
+    match = re.match(r"[^.\[]*", field_name)
+    root = match.group() if match else ""
+    rest = field_name[len(root):]
+    accessors: List[Accessor] = []
+    while rest:
+        if rest[0] == ".":
+            attr = re.match(r"\.([^.\[]*)", rest).group(1)  # type: ignore
+            if not attr:
+                raise ValueError(f"Empty attribute in format field {field_name}")
+            accessors.append((True, attr))
+            rest = rest[len(attr) + 1:]
+        elif rest[0] == "[":
+            end = rest.find("]")
+            if end < 2:
+                raise ValueError(f"Missing or empty ']' in format field {field_name}")
+            key = rest[1:end]
+            accessors.append((False, int(key) if key.isdigit() else key))
+            rest = rest[end + 1:]
+        else:
+            raise ValueError(
+                f"Only '.' or '[' may follow ']' in format field {field_name}")
+    return root, accessors
+
+
+class Template:
+    """
+    A format string parsed once, with the fields it depends on.
+    """
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.parts: List[Part] = []
+        self.fields: List[str] = []
+        # Nested fields in format specs are left to str.format
+        self.simple = True
+
+        for literal, field_name, format_spec, conversion in Formatter().parse(text):
+            if field_name is None:
+                self.parts.append((literal, None, [], None, ""))
+                continue
+            if "{" in (format_spec or ""):
+                self.simple = False
+            root, accessors = split_field(field_name)
+            self.parts.append(
+                (literal, root, accessors, conversion, format_spec or ""))
+            self.fields.append(field_name)
+
+        # Templates without fields render to a constant
+        self.static: Optional[str] = None if self.fields else "".join(
+            part[0] for part in self.parts)
+
+    @property
+    def env_keys(self) -> Set[str]:
+        """
+        Environment variables the template depends on, as {env.KEY} or {env[KEY]}.
+        """
+        keys = {str(accessors[0][1]) for _, root, accessors, _, _ in self.parts
+                if root == "env" and accessors}
+        for part in self.parts:
+            if "{" in part[4]:
+                keys |= get_template(part[4]).env_keys
+        return keys
+
+    def render(self, namespace: Optional[Dict[str, Any]] = None) -> str:
+        if self.static is not None:
+            return self.static
+        namespace = get_namespace() if namespace is None else namespace
+        if not self.simple:
+            return self.text.format(**namespace)
+
+        out: List[str] = []
+        for literal, root, accessors, conversion, format_spec in self.parts:
+            out.append(literal)
+            if root is None:
+                continue
+            value = namespace[root]
+            for is_attr, key in accessors:
+                value = getattr(value, key) if is_attr else value[key]
+            if conversion == "r":
+                value = repr(value)
+            elif conversion == "a":
+                value = ascii(value)
+            elif conversion == "s":
+                value = str(value)
+            out.append(format(value, format_spec))
+        return "".join(out)
+
+
+@lru_cache(maxsize=None)
+def get_template(text: str) -> Template:
+    """
+    Parses a format string once and caches it by content.
+    """
+    return Template(text)
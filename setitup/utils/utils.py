@@ -1,9 +1,7 @@
 import re
-from typing import Any, Callable, Dict, List
+from typing import Any, Dict, List, Literal, Optional, Tuple
 
-from flatdict import FlatDict
-from setitup.models.context import Context
-from setitup.models.settings import Settings
+from setitup.utils.templates import get_template
 
 # ---------------------------------------------------------------------------- #
 #                              String Manipulation                             #
@@ -13,6 +11,7 @@ from setitup.models.settings import Settings
 def sub(line: str) -> str:
     """
     Formats a string using settings, context and environment.
+    The string is parsed once and cached, see setitup.utils.templates.
 
     Args:
         line (str): string to be formatted.
@@ -20,7 +19,7 @@ def sub(line: str) -> str:
     Returns:
         str: formatted string.
     """
-    return line.format(settings=Settings, context=Context, env=Context.env)
+    return get_template(line).render()
 
 
 def trim_empty(content: str, max_lines: int = 2) -> str:
@@ -64,21 +63,97 @@ def is_string_list(items: Any) -> bool:
 #                                Data Structure                                #
 # ---------------------------------------------------------------------------- #
 
-def merge_dicts(dicts: List[Dict[str, Any]]) -> Dict[str, Any]:
+ListMerge = Literal["replace", "append", "key"]
+
+
+class MergeConflict(ValueError):
+    """
+    Raised when two sources disagree on the type of a value.
     """
-    Deep merge dictionaries by flattening.
+    pass
+
+
+def _merge_lists(values: List[Tuple[str, Any]], lists: ListMerge, list_key: Optional[str]) -> List[Any]:
+    if lists == "replace":
+        return values[-1][1]
+    merged: List[Any] = []
+    for _, value in values:
+        merged.extend(value)
+    if lists == "append":
+        return merged
+
+    # Merge tables sharing the same key, in order of first appearance
+    by_key: Dict[Any, int] = {}
+    result: List[Any] = []
+    for item in merged:
+        key = item.get(list_key) if isinstance(item, dict) else None
+        if key is None:
+            result.append(item)
+        elif key in by_key:
+            index = by_key[key]
+            result[index] = {**result[index], **item}
+        else:
+            by_key[key] = len(result)
+            result.append(item)
+    return result
+
+
+def _merge(values: List[Tuple[str, Any]], path: List[str], lists: ListMerge, list_key: Optional[str]) -> Any:
+    # Values contributed by a single source are shared, not copied
+    if len(values) == 1:
+        return values[0][1]
+
+    kinds = {dict if isinstance(v, dict) else list if isinstance(
+        v, list) else object for _, v in values}
+    if len(kinds) > 1:
+        sides = [f"{source}: {type(value).__name__}" for source,
+                 value in values]
+        raise MergeConflict(
+            [f"Conflicting types at {'.'.join(path)}"] + sides)
+
+    kind = kinds.pop()
+    if kind is object:
+        return values[-1][1]
+    if kind is list:
+        return _merge_lists(values, lists, list_key)
+
+    by_key: Dict[str, List[Tuple[str, Any]]] = {}
+    for source, value in values:
+        for key, item in value.items():
+            by_key.setdefault(key, []).append((source, item))
+    return {key: _merge(items, path + [key], lists, list_key) for key, items in by_key.items()}
+
+
+def merge_dicts(
+    dicts: List[Dict[str, Any]],
+    sources: Optional[List[str]] = None,
+    lists: ListMerge = "replace",
+    list_key: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Deep merge dictionaries. Later dictionaries override scalars of earlier ones.
+    Subtrees contributed by a single dictionary are shared with the input, not copied.
 
     Args:
         dicts (List[Dict[str, Any]]): dictionaries to be merged.
+        sources (Optional[List[str]], optional): names of the dictionaries for conflict reports. Defaults to None.
+        lists (ListMerge, optional): "replace" keeps the last list, "append" concatenates lists,
+            "key" concatenates lists and merges tables sharing the same list_key. Defaults to "replace".
+        list_key (Optional[str], optional): key identifying tables when lists is "key". Defaults to None.
+
+    Raises:
+        MergeConflict: when the same key holds values of different types.
 
     Returns:
         Dict[str, Any]: merged dictionary.
     """
-    empty_dict: Dict[str, Any] = {}
-    merged = FlatDict(empty_dict)
-    for item in dicts:
-        merged.update(FlatDict(item))
-    return merged.as_dict()
+    if lists == "key" and list_key is None:
+        raise ValueError("list_key is required to merge lists by key")
+    if sources is None:
+        sources = [f"<dict {i}>" for i in range(len(dicts))]
+    if not dicts:
+        return {}
+    return _merge(list(zip(sources, dicts)), [], lists, list_key)
 
 # @run_python
 # def overwrite(dir: Path, filename: str) -> None:
@@ -0,0 +1,89 @@
+import hashlib
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Iterator, List
+
+import pytest
+
+from setitup.models.context import Context
+from setitup.utils.fetch import Downloader, FetchCache
+
+
+class Handler(SimpleHTTPRequestHandler):
+    """
+    Serves the server's directory with strong ETags, and redirects /redirect/<name> to /<name>.
+    Absolute URLs are served as if the server were a forwarding proxy for their host.
+    Request paths are recorded on the server.
+    """
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        server: "FileServer" = self.server  # type: ignore
+        server.requests.append(self.path)
+        if self.path.startswith("http://"):
+            self.path = "/" + self.path.split("/", 3)[3]
+        if self.path.startswith("/redirect/"):
+            self.send_response(302)
+            self.send_header("Location", self.path[len("/redirect"):])
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        file_path = Path(self.translate_path(self.path))
+        if not file_path.is_file():
+            self.send_error(404)
+            return
+        content = file_path.read_bytes()
+        etag = f'"{hashlib.sha256(content).hexdigest()[:16]}"'
+        if self.headers.get("If-None-Match") == etag:
+            server.not_modified += 1
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+class FileServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, directory: Path) -> None:
+        self.requests: List[str] = []
+        self.not_modified = 0
+        super().__init__(("127.0.0.1", 0),
+                         lambda *args: Handler(*args, directory=str(directory)))
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/{path}"
+
+
+@pytest.fixture
+def http_server(tmp_path: Path) -> Iterator[FileServer]:
+    """
+    HTTP server on a thread, serving tmp_path/www.
+    """
+    directory = tmp_path / "www"
+    directory.mkdir()
+    server = FileServer(directory)
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def cache_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[Path]:
+    """
+    Empty cache directory for the fetch cache and git mirrors.
+    """
+    monkeypatch.setattr(Context, "cache_dir", tmp_path / "cache")
+    monkeypatch.setattr(FetchCache, "_fresh", {})
+    yield tmp_path / "cache"
+    Downloader.shutdown()
@@ -0,0 +1,51 @@
+from pathlib import Path
+
+import pytest
+
+from setitup.models.catalog import catalog_path, load_catalog, save_catalog
+from setitup.models.context import Context
+from setitup.models.recipes import Recipes, parse_recipes
+from setitup.models.settings import parse_settings
+
+RECIPE = """
+[tool]
+[[tool.install.steps]]
+kind = "shell"
+command = "echo {settings.root}"
+"""
+
+
+@pytest.fixture
+def recipes_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    monkeypatch.setattr(Context, "cache_dir", tmp_path / "cache")
+    directory = tmp_path / "input"
+    (directory / "settings").mkdir(parents=True)
+    (directory / "recipes").mkdir()
+    (directory / "settings" / "settings.toml").write_text('root = false\n[bundles]\nall = ["tool"]\n')
+    (directory / "recipes" / "tool.toml").write_text(RECIPE)
+    return directory
+
+
+def parse(directory: Path) -> None:
+    parse_settings(directory / "settings")
+    parse_recipes(directory / "recipes")
+
+
+def test_catalog_is_saved_in_the_cache(recipes_dir: Path) -> None:
+    parse(recipes_dir)
+    save_catalog(recipes_dir)
+    assert catalog_path(recipes_dir).is_file()
+    assert sorted(p.name for p in recipes_dir.iterdir()) == ["recipes", "settings"]
+
+    Recipes.recipes = {}
+    assert load_catalog(recipes_dir)
+    assert list(Recipes.recipes) == ["tool"]
+
+
+def test_catalog_with_failing_templates_is_not_loaded(recipes_dir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    parse(recipes_dir)
+    # What a stale catalog could hold: a step whose field no longer resolves
+    step = Recipes.recipes["tool"].install.steps[0]  # type: ignore
+    monkeypatch.setattr(step, "_command", "echo {settings.missing}")
+    save_catalog(recipes_dir)
+    assert not load_catalog(recipes_dir)
@@ -0,0 +1,98 @@
+import hashlib
+import time
+from pathlib import Path
+
+import pytest
+
+from setitup.models.context import Context
+from setitup.utils.fetch import Downloader, FetchCache, FetchError, download
+
+from .conftest import FileServer
+
+
+def write(server_dir: Path, name: str, content: bytes) -> str:
+    (server_dir / name).write_bytes(content)
+    return hashlib.sha256(content).hexdigest()
+
+
+def www(tmp_path: Path) -> Path:
+    return tmp_path / "www"
+
+
+def test_pinned_hit_makes_no_request(http_server: FileServer, cache_dir: Path, tmp_path: Path) -> None:
+    sha256 = write(www(tmp_path), "tool.tar", b"tool")
+    path = download(http_server.url("tool.tar"), sha256)
+    assert path.read_bytes() == b"tool"
+    assert download(http_server.url("tool.tar"), sha256) == path
+    assert http_server.requests == ["/tool.tar"]
+
+
+def test_hash_mismatch(http_server: FileServer, cache_dir: Path, tmp_path: Path) -> None:
+    write(www(tmp_path), "tool.tar", b"tampered")
+    with pytest.raises(FetchError, match="Hash mismatch"):
+        download(http_server.url("tool.tar"), hashlib.sha256(b"tool").hexdigest())
+    assert not list((cache_dir / "fetch" / "objects").glob("*/*"))
+
+
+def test_revalidation_with_etag(http_server: FileServer, cache_dir: Path, tmp_path: Path,
+                                monkeypatch: pytest.MonkeyPatch) -> None:
+    write(www(tmp_path), "install.sh", b"echo v1")
+    first = download(http_server.url("install.sh"))
+
+    # A later process revalidates instead of trusting its own earlier download
+    monkeypatch.setattr(FetchCache, "_fresh", {})
+    assert download(http_server.url("install.sh")) == first
+    assert http_server.not_modified == 1
+
+    monkeypatch.setattr(FetchCache, "_fresh", {})
+    write(www(tmp_path), "install.sh", b"echo v2")
+    assert download(http_server.url("install.sh")).read_bytes() == b"echo v2"
+    assert http_server.not_modified == 1
+
+
+def test_lru_eviction(http_server: FileServer, cache_dir: Path, tmp_path: Path,
+                      monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(Context, "fetch_cache_bytes", 250)
+    hashes = {name: write(www(tmp_path), name, name.encode() * 100) for name in "abc"}
+
+    download(http_server.url("a"), hashes["a"])
+    time.sleep(0.01)
+    download(http_server.url("b"), hashes["b"])
+    time.sleep(0.01)
+    # Using a makes b the least recently used
+    assert FetchCache.lookup(hashes["a"]) is not None
+    time.sleep(0.01)
+    download(http_server.url("c"), hashes["c"])
+
+    assert FetchCache.object_path(hashes["a"]).is_file()
+    assert not FetchCache.object_path(hashes["b"]).is_file()
+    assert FetchCache.object_path(hashes["c"]).is_file()
+
+
+def test_redirect(http_server: FileServer, cache_dir: Path, tmp_path: Path) -> None:
+    write(www(tmp_path), "tool.tar", b"tool")
+    assert download(http_server.url("redirect/tool.tar")).read_bytes() == b"tool"
+    assert http_server.requests == ["/redirect/tool.tar", "/tool.tar"]
+
+
+def test_failed_prefetch_is_retried(http_server: FileServer, cache_dir: Path, tmp_path: Path) -> None:
+    url = http_server.url("late.txt")
+    with pytest.raises(FetchError):
+        Downloader.submit(url).result()
+    write(www(tmp_path), "late.txt", b"late")
+    assert Downloader.fetch(url).read_bytes() == b"late"
+
+
+def test_http_proxy(http_server: FileServer, cache_dir: Path, tmp_path: Path,
+                    monkeypatch: pytest.MonkeyPatch) -> None:
+    write(www(tmp_path), "tool.tar", b"tool")
+    proxy = http_server.url("").rstrip("/")
+    monkeypatch.setattr(Context, "env", {"http_proxy": proxy})
+    assert download("http://downloads.invalid/tool.tar").read_bytes() == b"tool"
+    assert http_server.requests == ["http://downloads.invalid/tool.tar"]
+
+    # Hosts in no_proxy are reached directly
+    monkeypatch.setattr(Context, "env", {"http_proxy": "http://proxy.invalid:1",
+                                         "no_proxy": "127.0.0.1"})
+    download(http_server.url("tool.tar"))
+    assert http_server.requests[-1] == "/tool.tar"
@@ -0,0 +1,88 @@
+import subprocess
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+from setitup.utils.fetch import Downloader
+from setitup.utils.git import GitMirrors
+from setitup.utils.process import CommandError
+
+
+def run_git(*args: str, cwd: Path) -> str:
+    return subprocess.run(["git", "-c", "user.name=test", "-c", "user.email=test@example.com",
+                           "-c", "init.defaultBranch=main", *args],
+                          cwd=cwd, check=True, capture_output=True, text=True).stdout.strip()
+
+
+def commit(work: Path, name: str) -> None:
+    (work / name).write_text(name)
+    run_git("add", name, cwd=work)
+    run_git("commit", "-q", "-m", name, cwd=work)
+    run_git("push", "-q", "origin", "main", "--tags", cwd=work)
+
+
+@pytest.fixture
+def remote(tmp_path: Path, cache_dir: Path) -> Iterator[Path]:
+    """
+    Bare repository with commits f1 (tagged v1) and f2, pushed from tmp_path/work.
+    """
+    bare = tmp_path / "remote.git"
+    work = tmp_path / "work"
+    run_git("init", "-q", "--bare", str(bare), cwd=tmp_path)
+    run_git("init", "-q", str(work), cwd=tmp_path)
+    run_git("remote", "add", "origin", str(bare), cwd=work)
+    commit(work, "f1")
+    run_git("tag", "v1", cwd=work)
+    commit(work, "f2")
+    yield bare
+
+
+def new_run(monkeypatch: pytest.MonkeyPatch) -> None:
+    # What a later invocation would see: mirrors exist but have not been fetched yet
+    Downloader.shutdown()
+    monkeypatch.setattr(GitMirrors, "_fresh", set())
+
+
+def test_full_checkout(remote: Path, tmp_path: Path) -> None:
+    target = tmp_path / "full"
+    GitMirrors.checkout(str(remote), target)
+    assert sorted(p.name for p in target.glob("f*")) == ["f1", "f2"]
+    assert run_git("remote", "get-url", "origin", cwd=target) == str(remote)
+    assert (GitMirrors.mirror_path(str(remote)) / "HEAD").is_file()
+
+
+def test_shallow_checkout(remote: Path, tmp_path: Path) -> None:
+    target = tmp_path / "shallow"
+    GitMirrors.checkout(str(remote), target, depth=1)
+    assert (target / "f2").is_file()
+    assert run_git("rev-list", "--count", "HEAD", cwd=target) == "1"
+
+
+def test_checkout_tag(remote: Path, tmp_path: Path) -> None:
+    target = tmp_path / "tagged"
+    GitMirrors.checkout(str(remote), target, ref="v1", depth=1)
+    assert (target / "f1").is_file()
+    assert not (target / "f2").exists()
+
+
+@pytest.mark.parametrize("depth", [None, 1])
+def test_fast_forward_after_push(remote: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch,
+                                 depth: int) -> None:
+    target = tmp_path / "clone"
+    GitMirrors.checkout(str(remote), target, depth=depth)
+    commit(tmp_path / "work", "f3")
+
+    new_run(monkeypatch)
+    GitMirrors.checkout(str(remote), target, depth=depth)
+    assert (target / "f3").is_file()
+    assert run_git("rev-parse", "HEAD", cwd=target) == run_git(
+        "rev-parse", "main", cwd=tmp_path / "work")
+
+
+def test_refuses_non_repository(remote: Path, tmp_path: Path) -> None:
+    target = tmp_path / "occupied"
+    target.mkdir()
+    (target / "notes").write_text("mine")
+    with pytest.raises(CommandError, match="not a git repository"):
+        GitMirrors.checkout(str(remote), target)
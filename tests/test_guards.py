@@ -0,0 +1,24 @@
+from pathlib import Path
+
+from setitup.models.steps import GuardStep
+from setitup.utils.guards import GuardResults, depends_on_path_only
+
+
+def test_exists_is_not_memoized(tmp_path: Path) -> None:
+    GuardResults.invalidate()
+    expr = f"exists('{tmp_path / 'flag'}')"
+    assert not GuardResults.evaluate(expr)
+    (tmp_path / "flag").touch()
+    assert GuardResults.evaluate(expr)
+
+
+def test_path_guards_are_memoized() -> None:
+    assert depends_on_path_only("is_installed('git') and not all_installed('a', 'b')")
+    assert not depends_on_path_only("is_installed('git') or exists('/opt/git')")
+
+
+def test_naming_does_not_evaluate(tmp_path: Path) -> None:
+    GuardResults.invalidate()
+    step = GuardStep([f"exists('{tmp_path}')"])
+    assert f"{step}" == f"Guards: [exists('{tmp_path}')]"
+    assert GuardResults._results == {}
@@ -0,0 +1,46 @@
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+from setitup.models.context import Context
+from setitup.models.steps import GitStep, ShellStep
+from setitup.utils.events import current_package
+from setitup.utils.history import History
+
+
+@pytest.fixture
+def history(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[None]:
+    monkeypatch.setattr(Context, "state_dir", tmp_path / "state")
+    monkeypatch.setattr(History, "_conn", None)
+    Context.state.run_step = True
+    token = current_package.set("zsh")
+    yield
+    current_package.reset(token)
+    if History._conn is not None:
+        History._conn.close()
+
+
+def record(step: object, index: int, duration: float, status: int = 0) -> None:
+    History._record(step, index, 0.0, duration, status, 0)  # type: ignore
+
+
+def test_estimates_are_p50_of_successful_runs(history: None, tmp_path: Path,
+                                              monkeypatch: pytest.MonkeyPatch) -> None:
+    clone = GitStep("https://example.com/zsh.git", "~/zsh")
+    unpack = ShellStep("tar xf {context.tmp_dir}/zsh.tar")
+    History.begin("install")
+    for duration in [4.0, 1.0, 2.0]:
+        record(clone, 0, duration)
+    record(clone, 0, 60.0, status=1)
+    for name in ["first", "second"]:
+        # Every process has its own temporary directory
+        monkeypatch.setattr(Context, "tmp_dir", tmp_path / name)
+        record(unpack, 1, 3.0)
+    History.flush()
+
+    estimates = History.estimates(["zsh"], "install")
+    assert estimates == {("zsh", 0, clone.identity()): 2.0,
+                         ("zsh", 1, unpack.identity()): 3.0}
+    assert History.estimates(["zsh"], "config") == {}
+    assert [step["runs"] for step in History.stats(0.0)["zsh"]["slowest_steps"]] == [4, 2]
@@ -0,0 +1,44 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from setitup.utils.io import file_digest, hash_file, overwrite
+
+
+@pytest.fixture
+def link(tmp_path: Path) -> Path:
+    source = tmp_path / "src"
+    source.mkdir()
+    os.symlink("dotfiles/rc", source / "rc")
+    return source / "rc"
+
+
+def test_overwrite_link(link: Path, tmp_path: Path) -> None:
+    target = tmp_path / "rc"
+    target.write_text("file")
+    assert overwrite(link, target) == (1, 1)
+    assert os.readlink(target) == "dotfiles/rc"
+    assert overwrite(link, target) == (0, 1)
+
+    os.unlink(target)
+    os.symlink("elsewhere", target)
+    assert overwrite(link, target) == (1, 1)
+    assert os.readlink(target) == "dotfiles/rc"
+
+
+def test_overwrite_link_over_directory(link: Path, tmp_path: Path) -> None:
+    target = tmp_path / "rc"
+    target.mkdir()
+    with pytest.raises(IsADirectoryError, match="Cannot replace directory"):
+        overwrite(link, target)
+    assert target.is_dir()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["rc", "src"]
+
+
+def test_file_digest_follows_changes(tmp_path: Path) -> None:
+    path = tmp_path / "file"
+    path.write_text("one")
+    assert file_digest(path) == hash_file(path)
+    path.write_text("two!")
+    assert file_digest(path) == hash_file(path)
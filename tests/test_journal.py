@@ -0,0 +1,45 @@
+from pathlib import Path
+
+import pytest
+
+from setitup.models.context import Context
+from setitup.models.steps import ShellStep
+from setitup.utils.events import current_package
+from setitup.utils.journal import Journal
+
+
+def new_process(monkeypatch: pytest.MonkeyPatch, tmp_path: Path, name: str) -> None:
+    tmp_dir = tmp_path / name
+    tmp_dir.mkdir()
+    monkeypatch.setattr(Context, "tmp_dir", tmp_dir)
+
+
+def test_steps_in_tmp_dir_are_stable(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    step = ShellStep("tar xf {context.tmp_dir}/tool.tar")
+    new_process(monkeypatch, tmp_path, "first")
+    name, identity, fingerprint = f"{step}", step.identity(), step.fingerprint()
+
+    new_process(monkeypatch, tmp_path, "second")
+    assert f"{step}" != name
+    assert step.identity() == identity
+    assert step.fingerprint() == fingerprint
+    assert ShellStep("tar xf {context.tmp_dir}/other.tar").identity() != identity
+
+
+def test_resume_skips_recorded_steps(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(Context, "state_dir", tmp_path / "state")
+    steps = [ShellStep("cp {context.tmp_dir}/a ~"), ShellStep("cp {context.tmp_dir}/b ~")]
+    token = current_package.set("pkg")
+    try:
+        new_process(monkeypatch, tmp_path, "first")
+        Journal.open(["pkg"], "install", resume=False)
+        Journal.record(0, steps[0])
+        Journal.close(["pkg"], "install", ok=False)
+
+        new_process(monkeypatch, tmp_path, "second")
+        assert Journal.open(["pkg"], "install", resume=True) == 1
+        assert Journal.done(0, steps[0])
+        assert not Journal.done(1, steps[1])
+        Journal.close(["pkg"], "install", ok=True)
+    finally:
+        current_package.reset(token)
@@ -0,0 +1,91 @@
+import tomllib
+from pathlib import Path
+
+import pytest
+
+from setitup.utils.io import read_local_tomls
+from setitup.utils.utils import MergeConflict, merge_dicts
+
+BASE = """
+[zsh]
+depends = ["git"]
+[[zsh.install.no_root.steps]]
+kind = "shell"
+command = "install zsh"
+"""
+
+EXTRA = """
+[zsh]
+depends = ["curl"]
+[[zsh.install.no_root.steps]]
+kind = "shell"
+command = "install plugins"
+"""
+
+
+def write(tmp_path: Path, name: str, text: str) -> Path:
+    path = tmp_path / name
+    path.write_text(text)
+    return path
+
+
+def commands(merged: dict) -> list:
+    return [step["command"] for step in merged["zsh"]["install"]["no_root"]["steps"]]
+
+
+def test_replace(tmp_path: Path) -> None:
+    merged = read_local_tomls([write(tmp_path, "a.toml", BASE), write(tmp_path, "b.toml", EXTRA)])
+    assert commands(merged) == ["install plugins"]
+    assert merged["zsh"]["depends"] == ["curl"]
+
+
+def test_append(tmp_path: Path) -> None:
+    merged = read_local_tomls([write(tmp_path, "a.toml", BASE), write(tmp_path, "b.toml", EXTRA)],
+                              lists="append")
+    assert commands(merged) == ["install zsh", "install plugins"]
+    assert merged["zsh"]["depends"] == ["git", "curl"]
+
+
+def test_merge_by_key(tmp_path: Path) -> None:
+    targets = """
+[[targets]]
+name = "alice"
+home = "/home/alice"
+[[targets]]
+name = "bob"
+home = "/home/bob"
+"""
+    override = """
+[[targets]]
+name = "alice"
+home = "/srv/alice"
+[[targets]]
+name = "carol"
+home = "/home/carol"
+"""
+    merged = read_local_tomls([write(tmp_path, "a.toml", targets), write(tmp_path, "b.toml", override)],
+                              lists="key", list_key="name")
+    assert merged["targets"] == [{"name": "alice", "home": "/srv/alice"},
+                                 {"name": "bob", "home": "/home/bob"},
+                                 {"name": "carol", "home": "/home/carol"}]
+
+
+def test_merge_by_key_requires_key() -> None:
+    with pytest.raises(ValueError, match="list_key"):
+        merge_dicts([{}], lists="key")
+
+
+def test_single_source_is_not_copied() -> None:
+    base, extra = tomllib.loads(BASE), tomllib.loads(EXTRA)
+    base["bash"] = {"depends": []}
+    assert merge_dicts([base, extra])["bash"] is base["bash"]
+
+
+def test_conflict_names_both_sources(tmp_path: Path) -> None:
+    a = write(tmp_path, "a.toml", BASE)
+    b = write(tmp_path, "b.toml", '[zsh]\ndepends = "git"\n')
+    with pytest.raises(MergeConflict) as info:
+        read_local_tomls([a, b])
+    lines = info.value.args[0]
+    assert lines[0] == "Conflicting types at zsh.depends"
+    assert f"{a}: list" in lines and f"{b}: str" in lines
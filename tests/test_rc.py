@@ -0,0 +1,44 @@
+from pathlib import Path
+
+import pytest
+
+from setitup.models.dict_objects import ValidationError
+from setitup.models.steps import UpdateStep
+from setitup.utils import rc
+from setitup.utils.rc import rc_transaction
+
+
+@pytest.mark.parametrize("markers", [["# >>", ""], ["#", "#"], ["# >>"]])
+def test_invalid_markers(markers: list) -> None:
+    with pytest.raises(ValidationError):
+        UpdateStep.from_dict({"kind": "update", "source": "rc.tpl", "target": "rc",
+                              "sections": [], "markers": markers}, [])
+
+
+def test_update_is_written_before_the_transaction_ends(tmp_path: Path) -> None:
+    source = tmp_path / "rc.tpl"
+    source.write_text("# >> aliases\nalias ll='ls -l'\n# << aliases\n")
+    target = tmp_path / "rc"
+    with rc_transaction():
+        assert UpdateStep._run(str(source), str(target), [], ["# >>", "# <<"]) == \
+            "1 of 1 sections changed"
+        assert "alias ll='ls -l'" in target.read_text()
+        assert UpdateStep._run(str(source), str(target), [], ["# >>", "# <<"]) == \
+            "0 of 1 sections changed"
+
+
+def test_template_sections_are_hashed_once(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    source = tmp_path / "rc.tpl"
+    source.write_text("# >> a\nexport A=1\n# << a\n# >> b\nexport B=1\n# << b\n")
+    target = tmp_path / "rc"
+    # Template digests are computed when a target first has the section
+    for _ in range(2):
+        UpdateStep._run(str(source), str(target), [], ["# >>", "# <<"])
+
+    hashed = []
+    sha256 = rc.hashlib.sha256
+    monkeypatch.setattr(rc.hashlib, "sha256", lambda data: hashed.append(data) or sha256(data))
+    assert UpdateStep._run(str(source), str(target), ["b"], ["# >>", "# <<"]) == \
+        "0 of 1 sections changed"
+    # Only the section read from the target
+    assert hashed == [b"export B=1"]
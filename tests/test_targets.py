@@ -0,0 +1,27 @@
+from pathlib import Path
+
+import pytest
+
+from setitup.models.dict_objects import ValidationError
+from setitup.models.targets import Target
+
+
+def test_home_is_expanded_and_resolved(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("HOME", str(tmp_path))
+    target = Target.from_dict({"home": "~/homes/../alice"}, [])
+    assert target is not None
+    assert target.home == tmp_path / "alice"
+    assert target.name == "alice"
+    assert target.env == {}
+
+
+@pytest.mark.parametrize("name", ["", "..", "a/b", 3])
+def test_invalid_name(name: object, tmp_path: Path) -> None:
+    with pytest.raises(ValidationError):
+        Target.from_dict({"home": str(tmp_path), "name": name}, [])
+
+
+def test_home_is_not_a_file(tmp_path: Path) -> None:
+    (tmp_path / "file").touch()
+    with pytest.raises(ValidationError):
+        Target.from_dict({"home": str(tmp_path / "file")}, [])
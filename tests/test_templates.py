@@ -0,0 +1,38 @@
+import pytest
+
+from setitup.models.dict_objects import ValidationError
+from setitup.models.targets import Target
+from setitup.utils.templates import Template, split_field
+
+
+class Item:
+    name = "zsh"
+
+
+def test_split_field() -> None:
+    assert split_field("env") == ("env", [])
+    assert split_field("env.HOME") == ("env", [(True, "HOME")])
+    assert split_field("items[0].name") == ("items", [(False, 0), (True, "name")])
+    assert split_field("env[FOO.BAR]") == ("env", [(False, "FOO.BAR")])
+    for field in ["env.", "env[FOO", "env[]", "env[FOO]x"]:
+        with pytest.raises(ValueError):
+            split_field(field)
+
+
+def test_env_keys() -> None:
+    assert Template("{env[FOO]} {env.BAR}").env_keys == {"FOO", "BAR"}
+    assert Template("{env.A:>{env[W]}} {context.tmp_dir}").env_keys == {"A", "W"}
+    assert Template("plain").env_keys == set()
+
+
+def test_render_matches_format() -> None:
+    namespace = {"env": {"FOO": "foo"}, "items": [Item()], "n": 3}
+    for text in ["{env[FOO]}!", "{items[0].name!r:>8}", "{n:0{n}d}", "a {{b}}"]:
+        assert Template(text).render(namespace) == text.format(**namespace)
+
+
+def test_target_env_order() -> None:
+    Target.from_dict({"home": "/tmp", "env": {"A": "{env.HOME}", "B": "{env[A]}:x"}}, [])
+    with pytest.raises(ValidationError) as info:
+        Target.from_dict({"home": "/tmp", "env": {"A": "{env[B]}", "B": "x"}}, [])
+    assert "refers to B" in info.value.errors[0].message